@@ -0,0 +1,54 @@
+(ns bcljs.batch
+  (:require [cljs.analyzer :as ana]
+            [bcljs.compiler :as compiler]))
+
+; see driver/src/bclj/batch.py for the python side
+
+(defn batch-entry? [form]
+  (and (seq? form)
+       (true? (::compiler/batch-entry (meta form)))))
+
+(defn gen-literal-arg [arg]
+  (if (or (vector? arg) (map? arg))
+    (compiler/marshal-val arg)
+    arg))
+
+(defn gen-batch-entry [env form]
+  (cond
+    ; an explicit [callee pos-args kw-args] entry, literal args get marshalled like in static op calls
+    (vector? form) (let [[callee pos-args kw-args] form]
+                     (compiler/gen-batch-entry callee (gen-literal-arg pos-args) (gen-literal-arg kw-args)))
+
+    ; a call to a generated bcljs macro
+    (seq? form) (let [expanded (binding [compiler/*emit-batch-entry* true]
+                                 (ana/macroexpand-1 env form))]
+                  (if (batch-entry? expanded)
+                    expanded
+                    (throw (ex-info (str "bcljs pycall-batch: expected a call to generated Blender API fn, got "
+                                         (pr-str form)) {:form form}))))
+
+    :else (throw (ex-info (str "bcljs pycall-batch: unexpected batch entry " (pr-str form)) {:form form}))))
+
+(defn gen-on-error [opts]
+  (let [on-error (:on-error opts)]
+    (if (keyword? on-error)
+      (name on-error)
+      on-error)))
+
+(defmacro pycall-batch
+  "Runs given calls in a single crossing to python via bclj.pycall_batch and returns an array of their results.
+
+  Calls are forms calling generated Blender API fns or explicit [callee pos-args kw-args] vectors.
+  Optional opts map as the first argument may contain :on-error with :stop (default) or :collect,
+  with :collect failed calls get an error object in place of their result, see call-error?.
+
+    (pycall-batch {:on-error :collect}
+      (object/select-all {:action :deselect})
+      (mesh/primitive-cube-add {:location [0 0 1]})
+      [(js/bclj.bind \"builtins.setattr\") [cursor \"location\" [0 0 1]] nil])"
+  [& args]
+  (let [[opts calls] (if (map? (first args))
+                       [(first args) (rest args)]
+                       [nil args])
+        entries (map (partial gen-batch-entry &env) calls)]
+    `(~(symbol "js" "bclj.pycall_batch") (~'array ~@entries) ~(gen-on-error opts))))
@@ -1,11 +1,38 @@
 (ns bcljs.compiler
-  (:require [bcljs.shared :as shared]
+  (:require [cljs.env]
+            [bcljs.shared :as shared]
             [bcljs.invariants :as invariants]
             [bcljs.compiler.warnings :as warnings]))
 
 (def ^:dynamic *env*)
 (def ^:dynamic *form*)
 
+; -- config -----------------------------------------------------------------------------------------------------------------
+
+; compiler can be configured via cljs compiler options, e.g. in shadow-cljs.edn:
+;
+;   :compiler-options {:external-config {:bcljs {:bind-handles true}}}
+;
+; :bind-handles    op fns are called through python handles resolved once via bclj.bind and kept
+;                  in a *<fn>-handle var of generated namespace, instead of walking js/bpy.ops.<module>.<fn>
+;                  proxies on each call
+
+(def ^:dynamic *config* nil)
+
+; when set, op and fn calls are emitted as #js [callee pos-args kw-args] entries for bclj.pycall_batch,
+; see bcljs.batch/pycall-batch
+(def ^:dynamic *emit-batch-entry* false)
+
+(defn get-config []
+  (or *config*
+      (if-some [compiler-env cljs.env/*compiler*]
+        (get-in @compiler-env [:options :external-config :bcljs]))))
+
+(defn bind-handles? []
+  (true? (:bind-handles (get-config))))
+
+; -- marshalling ------------------------------------------------------------------------------------------------------------
+
 (declare marshal-val)
 
 (defn marshal-kv-arg [[key val]]
@@ -58,10 +85,10 @@
 
 (defn gen-marshalled-kw-args-dynamically [kw-args fn-name module]
   ; TODO: we can check for param names typos
-  (let [var-name (invariants/params-type-spec-var-name fn-name)
+  (let [var-name (invariants/params-index-var-name fn-name)
         ns-name (invariants/get-module-ns-name module)
-        params-type-specs-sym (symbol ns-name var-name)]
-    `(bcljs.runtime/marshal-kw-args ~kw-args ~params-type-specs-sym)))
+        params-index-sym (symbol ns-name var-name)]
+    `(bcljs.runtime/marshal-kw-args-indexed ~kw-args ~params-index-sym)))
 
 (defn gen-marshalled-kw-args [kw-args fn-name module param-specs]
   (cond
@@ -69,19 +96,48 @@
     (map? kw-args) (gen-marshalled-kw-args-statically kw-args param-specs)
     :else (gen-marshalled-kw-args-dynamically kw-args fn-name module)))
 
+; no need to allocate an empty array, bclj.pycall accepts null
+(defn gen-pos-args [pos-args]
+  (if-not (empty? pos-args)
+    `(~'array ~@pos-args)))
+
+(defn gen-batch-entry [callee pos-args kw-args]
+  (with-meta `(~'array ~callee ~pos-args ~kw-args) {::batch-entry true}))
+
 (defn gen-fn [module fn-name args]
   (let [module-name (invariants/get-module-name module)
         js-symbol (symbol "js" (str module-name "." fn-name))]
-    `(~js-symbol ~@args)))
+    (if *emit-batch-entry*
+      (gen-batch-entry js-symbol (gen-pos-args args) nil)
+      `(~js-symbol ~@args))))
+
+; the handle var is read directly at the call site and filled on first call
+(defn gen-bound-handle [module fn-name]
+  (let [module-name (invariants/get-module-name module)
+        ns-name (invariants/get-module-ns-name module)
+        handle-sym (symbol ns-name (invariants/handle-var-name fn-name))
+        path (invariants/python-fn-path module-name fn-name)
+        bind (symbol "js" "bclj.bind")]
+    `(~'let [handle# ~handle-sym]
+       (if (~'nil? handle#)
+         (set! ~handle-sym (~bind ~path))
+         handle#))))
+
+(defn gen-op-fn-callee [module fn-name]
+  (if (bind-handles?)
+    (gen-bound-handle module fn-name)
+    (let [module-name (invariants/get-module-name module)]
+      (symbol "js" (invariants/python-fn-path module-name fn-name)))))
 
 (defn gen-op-fn [module fn-name args]
   (let [[pos-args kw-args] args
-        module-name (invariants/get-module-name module)
         py-call (symbol "js" "bclj.pycall")
-        js-symbol (symbol "js" (str module-name "." fn-name))
+        callee (gen-op-fn-callee module fn-name)
         param-specs (get-in module [:params fn-name])
         marshalled-kw-args (gen-marshalled-kw-args kw-args fn-name module param-specs)]
-    `(~py-call ~js-symbol (~'array ~@pos-args) ~marshalled-kw-args)))
+    (if *emit-batch-entry*
+      (gen-batch-entry callee (gen-pos-args pos-args) marshalled-kw-args)
+      `(~py-call ~callee ~(gen-pos-args pos-args) ~marshalled-kw-args))))
 
 (defn gen* [kind module name args]
   (case kind
@@ -118,4 +174,7 @@
 
   (gen {} {} :op-fn m "add" '[] '(identity {:align       :world
                                             :translation [1 2 3]}))
+
+  (binding [*config* {:bind-handles true}]
+    (gen {} {} :op-fn m "add" '[] '{:align :world}))
   )
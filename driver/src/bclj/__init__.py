@@ -1,5 +1,7 @@
+from bclj import startup
 from bclj import boot
 from bclj import main
 
-boot.init()
+with startup.phase("boot init"):
+    boot.init()
 main.start()
@@ -0,0 +1,102 @@
+import array
+
+# bulk transfer of bpy collection data to/from js typed arrays
+#
+# STPyV8 does not map python buffers to ArrayBuffers, so we pack the raw bytes into a "binary string" (latin-1),
+# which crosses the boundary as a single value, js side then copies it once into a typed array (and vice versa),
+# compared to per-element access this turns e.g. 300k crossings for 100k vertex coordinates into one
+#
+# usage from js:
+#
+#   var co = bclj.foreach_get(mesh.vertices, "co");       // Float32Array of length 3 * vertex count
+#   co[0] += 1.0;
+#   bclj.foreach_set(mesh.vertices, "co", co);
+#   mesh.update();
+#
+#   var indices = bclj.foreach_get(mesh.polygons, "vertices", "i");  // Int32Array
+
+supported_type_codes = ("f", "i")
+
+
+def get_item_length(collection, attr):
+    if len(collection) == 0:
+        return 0
+    value = getattr(collection[0], attr)
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+
+def make_buffer(type_code, length):
+    assert type_code in supported_type_codes, "unsupported type code '{}'".format(type_code)
+    return array.array(type_code, bytes(length * array.array(type_code).itemsize))
+
+
+def foreach_get_packed(collection, attr, type_code="f"):
+    buffer = make_buffer(type_code, len(collection) * get_item_length(collection, attr))
+    collection.foreach_get(attr, buffer)
+    return buffer.tobytes().decode("latin-1")
+
+
+def foreach_set_packed(collection, attr, type_code, data):
+    buffer = make_buffer(type_code, 0)
+    buffer.frombytes(data.encode("latin-1"))
+    collection.foreach_set(attr, buffer)
+
+
+js_prelude = """
+(function(bclj) {
+  var arrayTypes = {"f": Float32Array, "i": Int32Array};
+  var chunkSize = 8192;
+
+  function typeCodeOf(typedArray) {
+    if (typedArray instanceof Int32Array) {
+      return "i";
+    }
+    return "f";
+  }
+
+  // python side reinterprets raw bytes as float32 or int32,
+  // so other typed arrays (Float64Array, Uint8Array...) and plain arrays get converted to Float32Array
+  function asSupportedArray(values) {
+    if (values instanceof Float32Array || values instanceof Int32Array) {
+      return values;
+    }
+    if (values instanceof DataView) {
+      throw new TypeError("bclj.foreach_set: DataView is not supported, pass a Float32Array or Int32Array");
+    }
+    return new Float32Array(values);
+  }
+
+  function unpack(data, type) {
+    var length = data.length;
+    var bytes = new Uint8Array(length);
+    for (var i = 0; i < length; i++) {
+      bytes[i] = data.charCodeAt(i);
+    }
+    return new arrayTypes[type](bytes.buffer);
+  }
+
+  function pack(typedArray) {
+    var bytes = new Uint8Array(typedArray.buffer, typedArray.byteOffset, typedArray.byteLength);
+    var parts = [];
+    for (var i = 0; i < bytes.length; i += chunkSize) {
+      parts.push(String.fromCharCode.apply(null, bytes.subarray(i, i + chunkSize)));
+    }
+    return parts.join("");
+  }
+
+  bclj.pack_typed_array = pack;
+
+  bclj.foreach_get = function(collection, attr, type) {
+    type = type || "f";
+    return unpack(bclj.foreach_get_packed(collection, attr, type), type);
+  };
+
+  bclj.foreach_set = function(collection, attr, values) {
+    values = asSupportedArray(values);
+    bclj.foreach_set_packed(collection, attr, typeCodeOf(values), pack(values));
+  };
+})(bclj);
+"""
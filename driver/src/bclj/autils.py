@@ -1,26 +1,102 @@
+import os
+import atexit
 import inspect
 import logging
 import asyncio
 from functools import wraps
-from threading import Thread
+from threading import Thread, Lock
 
 logger = logging.getLogger(__name__)
 
+# asyncio debug mode adds slow callback tracking and coroutine origin capturing to every task, it is opt-in
+asyncio_debug = os.environ.get("BCLJ_ASYNCIO_DEBUG") is not None
+
+# use uvloop for the I/O loop if it is installed
+uvloop_enabled = os.environ.get("BCLJ_NO_UVLOOP") is None
+
+io_loop_shutdown_timeout = 5
+
+io_loop = None
+io_loop_thread = None
+io_loop_lock = Lock()
+io_loop_shutdown_hooks = []
+
+
+def new_event_loop():
+    if uvloop_enabled:
+        try:
+            import uvloop
+            return uvloop.new_event_loop()
+        except ImportError:
+            pass
+    return asyncio.new_event_loop()
+
 
 def async_loop_thread(loop):
     asyncio.set_event_loop(loop)
-    loop.set_debug(True)
+    loop.set_debug(asyncio_debug)
     logger.debug("Entering async loop {}".format(loop))
-    loop.run_forever()
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+        logger.debug("Left async loop {}".format(loop))
 
 
 def start_async_loop(name):
-    loop = asyncio.new_event_loop()
+    loop = new_event_loop()
     t = Thread(target=async_loop_thread, args=(loop,))
     t.name = "{} [async loop]".format(name)
     t.daemon = True
     t.start()
-    return loop
+    return loop, t
+
+
+# -- shared I/O reactor -----------------------------------------------------------------------------------------------------
+
+# all network shims share one I/O loop running in a background thread
+def get_io_loop():
+    global io_loop, io_loop_thread
+    with io_loop_lock:
+        if io_loop is None:
+            io_loop, io_loop_thread = start_async_loop("bclj.io")
+            atexit.register(shutdown_io_loop)
+        return io_loop
+
+
+# hooks are coroutine functions called on the I/O loop during shutdown, e.g. to close sessions
+def register_io_loop_shutdown_hook(hook):
+    assert inspect.iscoroutinefunction(hook)
+    io_loop_shutdown_hooks.append(hook)
+
+
+async def run_io_loop_shutdown():
+    for hook in io_loop_shutdown_hooks:
+        try:
+            await hook()
+        except Exception:
+            logger.exception("Shutdown hook {} failed".format(hook))
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current and not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def shutdown_io_loop():
+    global io_loop, io_loop_thread
+    with io_loop_lock:
+        loop, thread = io_loop, io_loop_thread
+        io_loop, io_loop_thread = None, None
+    if loop is None or loop.is_closed():
+        return
+    logger.debug("Shutting down I/O loop {}".format(loop))
+    try:
+        asyncio.run_coroutine_threadsafe(run_io_loop_shutdown(), loop).result(io_loop_shutdown_timeout)
+    except Exception as e:
+        logger.debug("I/O loop did not shut down cleanly: {}".format(e))
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(io_loop_shutdown_timeout)
 
 
 def wrap_coroutine_with_exceptions_reporting(coro, *args, **kwargs):
@@ -42,7 +118,11 @@ def call_soon(loop, coro, *args, **kwargs):
     return asyncio.run_coroutine_threadsafe(wrapped_coro(), loop)
 
 
-async def get_result(fut):
-    while not fut.done():
-        await asyncio.sleep(0.1)
-    return fut.result()
+# await a concurrent future (e.g. from call_soon) scheduled on another loop,
+# we get woken up via call_soon_threadsafe when it completes, cancelling our side (or timing out) cancels the source
+async def get_result(fut, timeout=None):
+    bridged_fut = asyncio.wrap_future(fut)
+    if timeout is None:
+        return await bridged_fut
+    else:
+        return await asyncio.wait_for(bridged_fut, timeout)
@@ -0,0 +1,102 @@
+import logging
+
+from bclj import v8, stats
+
+logger = logging.getLogger(__name__)
+
+# batched python calls from js
+#
+# each bclj.pycall is a separate crossing of the js/python boundary with argument conversion both ways,
+# bclj.pycall_batch runs many calls in one crossing, calls is an array of [callable, pos_args, kw_args] entries,
+# pos_args and kw_args can be null
+#
+# error policies:
+#   "stop"     (default) raise on the first failed call, remaining calls are not executed
+#   "collect"  run all calls, failed calls get a CallError in place of their result
+#
+# usage from js:
+#
+#   var cursor = bpy.context.scene.cursor;
+#   var results = bclj.pycall_batch([[bclj.bind("builtins.setattr"), [cursor, "location", [0, 0, 1]], null],
+#                                    [bpy.ops.object.select_all, null, {action: "DESELECT"}]],
+#                                   "collect");
+#   if (bclj.is_call_error(results[1])) { console.warn(results[1].message); }
+#
+# from bcljs see bcljs.batch/pycall-batch macro
+
+error_policies = ("stop", "collect")
+
+batch_stats = {
+    "batches": 0,
+    "calls": 0,
+    "errors": 0,
+    "max_batch_size": 0,
+}
+
+
+def get_batch_stats():
+    return dict(batch_stats)
+
+
+stats.register_provider("batch", get_batch_stats)
+
+
+class CallError(v8.JSClass):
+
+    def __init__(self, index, e):
+        super().__init__()
+        self.isCallError = True
+        self.index = index
+        self.type = type(e).__name__
+        self.message = str(e)
+
+    def __str__(self):
+        return "call #{} failed with {}: {}".format(self.index, self.type, self.message)
+
+
+class BatchCallError(Exception):
+    pass
+
+
+def invoke(f, pos_args, map_args):
+    if map_args is not None:
+        if pos_args is not None:
+            return f(*pos_args, **map_args)
+        else:
+            return f(**map_args)
+    else:
+        if pos_args is not None and len(pos_args) > 0:
+            return f(*pos_args)
+        else:
+            return f()
+
+
+def run_batch(calls, on_error=None):
+    on_error = on_error or "stop"
+    if on_error not in error_policies:
+        raise ValueError("unknown error policy '{}', expected one of {}".format(on_error, ", ".join(error_policies)))
+    collect = on_error == "collect"
+    count = len(calls)
+    batch_stats["batches"] += 1
+    batch_stats["max_batch_size"] = max(batch_stats["max_batch_size"], count)
+    results = []
+    for i in range(count):
+        call = calls[i]
+        batch_stats["calls"] += 1
+        try:
+            results.append(invoke(call[0], call[1], call[2]))
+        except Exception as e:
+            batch_stats["errors"] += 1
+            if not collect:
+                raise BatchCallError("batch call #{} of {} failed: {}".format(i, count, e)) from e
+            results.append(CallError(i, e))
+    return results
+
+
+js_prelude = """
+(function(bclj) {
+  bclj.is_call_error = function(result) {
+    return !!(result && result.isCallError);
+  };
+})(bclj);
+"""
@@ -0,0 +1,339 @@
+# benchmarks meant to be run inside a live Blender session with booted js runtime,
+# for example from HyREPL:
+#
+#   (import [bclj [bench]])
+#   (bench.run-ws-latency-benchmark)
+#   (bench.run-logging-benchmark)
+#   (bench.run-dom-benchmark)
+#   (bench.run-bulk-benchmark)
+#   (bench.run-bind-benchmark)
+#   (bench.run-batch-benchmark)
+#
+# results are reported via logger when the benchmark finishes
+#
+
+import sys
+import time
+import random
+import logging
+import importlib
+import tracemalloc
+
+import bpy
+import websockets
+
+from bclj import log, autils, js, ws, bulk
+
+logger = logging.getLogger(__name__)
+
+
+def summarize_samples(samples):
+    ordered = sorted(samples)
+    count = len(ordered)
+    if count == 0:
+        return {"count": 0}
+
+    def percentile(p):
+        return ordered[min(count - 1, int(p * count))]
+
+    return {"count": count,
+            "mean": sum(ordered) / count,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": ordered[-1]}
+
+
+def format_summary_ms(name, summary):
+    if summary["count"] == 0:
+        return "{}: no samples".format(name)
+    parts = ["{}={:.3f}ms".format(k, summary[k] * 1000) for k in ("mean", "p50", "p95", "p99", "max")]
+    return "{}: n={} {}".format(name, summary["count"], " ".join(parts))
+
+
+# -- websocket round-trip latency -------------------------------------------------------------------------------------------
+
+async def echo_handler(connection, *_):
+    async for msg in connection:
+        await connection.send(msg)
+
+
+async def start_echo_server():
+    return await websockets.serve(echo_handler, "127.0.0.1", 0)
+
+
+async def stop_echo_server(server):
+    server.close()
+    await server.wait_closed()
+
+
+ws_latency_js_template = """
+(function() {
+  var remaining = %d;
+  var samples = [];
+  var sock = new WebSocket("%s");
+  var sent_at = 0;
+  function ping() {
+    sent_at = benchClock();
+    sock.send("ping");
+  }
+  sock.onopen = ping;
+  sock.onmessage = function(e) {
+    samples.push(benchClock() - sent_at);
+    remaining -= 1;
+    if (remaining > 0) {
+      ping();
+    } else {
+      benchDone(samples);
+    }
+  };
+})();
+"""
+
+
+def run_ws_latency_benchmark(count=200):
+    """Measures round trip from WebSocket.send() in js through a local echo server back to js onmessage callback."""
+    ws.start_async_loop_if_needed()
+    server = autils.call_soon(ws.async_loop, start_echo_server).result()
+    port = server.sockets[0].getsockname()[1]
+    url = "ws://127.0.0.1:{}".format(port)
+    started_at = time.perf_counter()
+
+    def done(samples):
+        elapsed = time.perf_counter() - started_at
+        summary = summarize_samples(list(samples))
+        logger.info(format_summary_ms("ws round-trip latency", summary))
+        logger.info("ws latency benchmark took {:.3f}s".format(elapsed))
+        autils.call_soon(ws.async_loop, stop_echo_server, server)
+
+    root = js.current_root
+    root.benchClock = time.perf_counter
+    root.benchDone = done
+    logger.info("running ws latency benchmark with {} messages against {}".format(count, url))
+    js.js_eval(ws_latency_js_template % (count, url))
+
+
+# -- logging overhead -------------------------------------------------------------------------------------------------------
+
+def measure_per_call(f, count):
+    started_at = time.perf_counter()
+    for i in range(count):
+        f(i)
+    return (time.perf_counter() - started_at) / count
+
+
+def run_logging_benchmark(count=100000, payload_size=64 * 1024):
+    """Measures per-message cost of a filtered out debug log call with a large payload, eager vs. lazy formatting."""
+    bench_logger = logging.getLogger(__name__ + ".logging")
+    orig_level = bench_logger.level
+    bench_logger.setLevel(logging.INFO)
+    payload = "x" * payload_size
+
+    def eager(i):
+        bench_logger.debug("ws#{} got message len={}\n<< {}".format(i, len(payload), log.abbreviate(payload)))
+
+    def lazy(i):
+        bench_logger.debug(log.fmt("ws#{} got message len={}\n<< {}", i, len(payload), log.abbreviated(payload)))
+
+    try:
+        results = [("eager format", measure_per_call(eager, count)),
+                   ("lazy format", measure_per_call(lazy, count))]
+    finally:
+        bench_logger.setLevel(orig_level)
+
+    for name, per_call in results:
+        logger.info("logging with debug off, {:<12}: {:.3f}us per message".format(name, per_call * 1000000))
+    return results
+
+
+# -- dom backends -----------------------------------------------------------------------------------------------------------
+
+dom_backend_modules = ["bclj.dom", "bclj.dom_bs4"]
+
+
+def import_dom_backend(module_name):
+    already_imported = module_name in sys.modules
+    started_at = time.perf_counter()
+    backend = importlib.import_module(module_name)
+    import_time = None if already_imported else time.perf_counter() - started_at
+    return backend, import_time
+
+
+def measure_document_memory(backend, count):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        docs = [backend.create_document() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del docs
+    return (after - before) / count
+
+
+# roughly what shadow-cljs devtools and goog.dom do: create elements, set ids, assign html fragments, walk siblings,
+# look things up
+def run_dom_workload(backend, count):
+    doc = backend.create_html_document("bench")
+    body = doc.find("body")
+    for i in range(count):
+        el = backend.create_element(doc, "div")
+        el["id"] = "node-{}".format(i)
+        body.append(el)
+        for node in backend.parse_fragment('<span class="item">item {}</span><b>bold</b> tail'.format(i)):
+            el.append(node)
+    node = body.contents[0]
+    while node is not None:
+        node = node.next_sibling
+    for i in range(0, count, 10):
+        doc.find(attrs={"id": "node-{}".format(i)})
+    return str(doc)
+
+
+def run_dom_benchmark(count=500, documents=100):
+    """Compares native and bs4 dom backends of the thug shim: import time, memory per empty document, mutation workload."""
+    results = {}
+    for module_name in dom_backend_modules:
+        try:
+            backend, import_time = import_dom_backend(module_name)
+        except ImportError as e:
+            logger.info("skipping dom backend '{}': {}".format(module_name, e))
+            continue
+
+        started_at = time.perf_counter()
+        for _ in range(documents):
+            backend.create_document()
+        create_time = (time.perf_counter() - started_at) / documents
+
+        memory = measure_document_memory(backend, documents)
+
+        started_at = time.perf_counter()
+        run_dom_workload(backend, count)
+        workload_time = time.perf_counter() - started_at
+
+        results[backend.backend_name] = {"import": import_time,
+                                         "create_document": create_time,
+                                         "document_memory": memory,
+                                         "workload": workload_time}
+        import_report = "{:.1f}ms".format(import_time * 1000) if import_time is not None else "n/a (already imported)"
+        logger.info("dom backend {:<6}: import {}, create document {:.1f}us, {:.0f} bytes per document, "
+                    "workload with {} elements {:.1f}ms".format(backend.backend_name, import_report,
+                                                                create_time * 1000000, memory, count,
+                                                                workload_time * 1000))
+    return results
+
+
+# -- bulk object creation ---------------------------------------------------------------------------------------------------
+
+def random_locations(count, extent=50.0):
+    return [random.uniform(-extent, extent) for _ in range(count * 3)]
+
+
+def run_operator_path(locations, count):
+    objects = []
+    for i in range(count):
+        bpy.ops.mesh.primitive_cube_add(location=locations[i * 3:i * 3 + 3])
+        objects.append(bpy.context.object)
+    return objects
+
+
+def run_bulk_benchmark(count=10000, operator_count=1000):
+    """Compares bulk.create_objects with bpy.ops.mesh.primitive_cube_add.
+
+    The operator path gets slower with each object already in the scene, running it for 10k objects takes minutes,
+    so by default we run it for operator_count objects and extrapolate linearly (which is optimistic for it)."""
+    locations = random_locations(count)
+
+    started_at = time.perf_counter()
+    objects = bulk.create_objects("cube", count, locations=locations, name="BenchBulk")
+    bulk_time = time.perf_counter() - started_at
+    bulk.remove_collection("BenchBulk")
+
+    operator_count = min(operator_count, count)
+    started_at = time.perf_counter()
+    objects = run_operator_path(locations, operator_count)
+    operator_time = time.perf_counter() - started_at
+    bulk.remove_objects(objects)
+
+    extrapolated = operator_time / operator_count * count
+    logger.info("bulk.create_objects: {} objects in {:.3f}s ({:.1f}us per object)".format(count, bulk_time,
+                                                                                          bulk_time / count * 1000000))
+    logger.info("bpy.ops primitive_cube_add: {} objects in {:.3f}s ({:.1f}us per object), "
+                "{} objects extrapolated to {:.1f}s".format(operator_count, operator_time,
+                                                            operator_time / operator_count * 1000000, count,
+                                                            extrapolated))
+    return {"bulk": bulk_time, "operator": operator_time, "operator_count": operator_count,
+            "operator_extrapolated": extrapolated}
+
+
+# -- bound handles ----------------------------------------------------------------------------------------------------------
+
+bind_js_template = """
+(function() {
+  var count = %d;
+  var started_at = benchClock();
+  for (var i = 0; i < count; i++) {
+    bclj.pycall(bpy.ops.mesh.primitive_cube_add.poll, null, null);
+  }
+  var walk_time = benchClock() - started_at;
+  var poll = bclj.bind("bpy.ops.mesh.primitive_cube_add.poll");
+  started_at = benchClock();
+  for (var i = 0; i < count; i++) {
+    bclj.pycall(poll, null, null);
+  }
+  var bound_time = benchClock() - started_at;
+  benchDone(walk_time, bound_time);
+})();
+"""
+
+
+def run_bind_benchmark(count=100000):
+    """Compares calling bpy.ops.mesh.primitive_cube_add.poll via path walked from js with calling a bound handle."""
+    def done(walk_time, bound_time):
+        logger.info("js path walk: {} calls in {:.3f}s ({:.1f}us per call)".format(count, walk_time,
+                                                                                    walk_time / count * 1000000))
+        logger.info("bound handle: {} calls in {:.3f}s ({:.1f}us per call)".format(count, bound_time,
+                                                                                    bound_time / count * 1000000))
+
+    root = js.current_root
+    root.benchClock = time.perf_counter
+    root.benchDone = done
+    js.js_eval(bind_js_template % count)
+
+
+# -- batched calls ----------------------------------------------------------------------------------------------------------
+
+batch_js_template = """
+(function() {
+  var count = %d;
+  var setattr = bclj.bind("builtins.setattr");
+  var cursor = bpy.context.scene.cursor;
+  var started_at = benchClock();
+  for (var i = 0; i < count; i++) {
+    bclj.pycall(setattr, [cursor, "location", [i, 0, 0]], null);
+  }
+  var individual_time = benchClock() - started_at;
+  started_at = benchClock();
+  var calls = [];
+  for (var i = 0; i < count; i++) {
+    calls.push([setattr, [cursor, "location", [i, 0, 0]], null]);
+  }
+  bclj.pycall_batch(calls, "stop");
+  var batch_time = benchClock() - started_at;
+  benchDone(individual_time, batch_time);
+})();
+"""
+
+
+def run_batch_benchmark(count=10000):
+    """Compares setting a property via individual bclj.pycall calls with one bclj.pycall_batch call."""
+    def done(individual_time, batch_time):
+        logger.info("individual pycalls: {} calls in {:.3f}s ({:.1f}us per call)".format(
+            count, individual_time, individual_time / count * 1000000))
+        logger.info("pycall_batch: {} calls in {:.3f}s ({:.1f}us per call)".format(
+            count, batch_time, batch_time / count * 1000000))
+
+    root = js.current_root
+    root.benchClock = time.perf_counter
+    root.benchDone = done
+    js.js_eval(batch_js_template % count)
@@ -3,10 +3,12 @@ import sys
 
 import bpy  # import blender
 
-from bclj import worker, hy, os
+from bclj import worker, hy, os, timers, console
 
 logger = logging.getLogger(__name__)
 
+redraw_handler = None
+
 
 # noinspection PyMethodMayBeStatic
 class ModalTimerOperator(bpy.types.Operator):
@@ -15,16 +17,31 @@ class ModalTimerOperator(bpy.types.Operator):
     bl_label = "BCLJ Event Loop Operator"
 
     _timer = None
+    _timer_interval = None
+
+    def _schedule_timer(self, context, interval):
+        wm = context.window_manager
+        if self._timer is not None:
+            wm.event_timer_remove(self._timer)
+        self._timer = wm.event_timer_add(interval, window=context.window)
+        self._timer_interval = interval
+
+    def _adapt_timer(self, context, interval):
+        # re-registering timer is not free, do it only on significant change
+        if abs(interval - self._timer_interval) > 0.2 * self._timer_interval:
+            self._schedule_timer(context, interval)
 
-    def modal(self, _context, event):
+    def modal(self, context, event):
         if event.type == 'TIMER':
-            worker.drain_asyncio_event_loop()
+            interval = worker.pump_asyncio_event_loop()
+            console.flush()
             hy.check_live_file()
+            self._adapt_timer(context, interval)
         return {'PASS_THROUGH'}
 
     def execute(self, context):
         wm = context.window_manager
-        self._timer = wm.event_timer_add(0.1, window=context.window)
+        self._schedule_timer(context, worker.pump_interval)
         wm.modal_handler_add(self)
         hy.log_live_file_watching_start()
         return {'RUNNING_MODAL'}
@@ -32,23 +49,41 @@ class ModalTimerOperator(bpy.types.Operator):
     def cancel(self, context):
         wm = context.window_manager
         wm.event_timer_remove(self._timer)
+        self._timer = None
+        hy.stop_live_file_watcher()
         hy.log_live_file_watching_stop()
 
 
-def frame_change_handler(_scene):
-    hy.run_live_file()
+def is_animation_playing():
+    screen = bpy.context.screen
+    return screen is not None and screen.is_animation_playing
+
+
+def get_frame_duration(scene):
+    return scene.render.fps_base / scene.render.fps
+
+
+def frame_change_handler(scene):
+    hy.run_live_file(scene.frame_current, get_frame_duration(scene), is_animation_playing())
 
 
 def register():
+    global redraw_handler
     bpy.utils.register_class(ModalTimerOperator)
     bpy.app.handlers.frame_change_post.append(frame_change_handler)
+    # drives window.requestAnimationFrame
+    redraw_handler = bpy.types.SpaceView3D.draw_handler_add(timers.on_redraw, (), 'WINDOW', 'POST_PIXEL')
     # this is important to instantiate our operator and kick off the timer
     bpy.ops.wm.modal_timer_operator()
 
 
 def unregister():
+    global redraw_handler
     bpy.utils.unregister_class(ModalTimerOperator)
     bpy.app.handlers.frame_change_post.remove(frame_change_handler)
+    if redraw_handler is not None:
+        bpy.types.SpaceView3D.draw_handler_remove(redraw_handler, 'WINDOW')
+        redraw_handler = None
 
 
 def kill(code):
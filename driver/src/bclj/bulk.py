@@ -0,0 +1,208 @@
+import array
+import logging
+
+import bpy
+import bmesh
+
+from bclj import arrays
+
+logger = logging.getLogger(__name__)
+
+# bulk object creation through bpy.data
+#
+# creating objects via bpy.ops.mesh.primitive_*_add pays for operator invocation, an undo push and a depsgraph update
+# per object, here we create one mesh and many objects sharing it (linked duplicates) directly in bpy.data,
+# transforms come as flat arrays (3 floats per object)
+#
+# new objects are linked into a fresh collection which gets linked into the scene only at the end,
+# linking objects into a collection already visible in the scene resyncs view layers on each link
+#
+# usage from hy:
+#
+#   (import [bclj [bulk]])
+#   (bulk.create-objects "cube" 10000 :locations locs :name "HyLife")
+#
+# usage from js:
+#
+#   bclj.create_objects("cube", 10000, {locations: new Float32Array(30000), scales: ...});
+#   bclj.create_vertex_instances(obj, new Float32Array(30000));
+
+default_name = "Bulk"
+
+primitive_kinds = ("cube", "plane", "uv_sphere", "ico_sphere", "cone", "cylinder", "circle")
+
+
+def build_primitive(bm, kind, size):
+    radius = size / 2
+    if kind == "cube":
+        bmesh.ops.create_cube(bm, size=size)
+    elif kind == "plane":
+        bmesh.ops.create_grid(bm, x_segments=1, y_segments=1, size=radius)
+    elif kind == "uv_sphere":
+        bmesh.ops.create_uvsphere(bm, u_segments=32, v_segments=16, diameter=radius)
+    elif kind == "ico_sphere":
+        bmesh.ops.create_icosphere(bm, subdivisions=2, diameter=radius)
+    elif kind == "cone":
+        bmesh.ops.create_cone(bm, cap_ends=True, segments=32, diameter1=radius, diameter2=0, depth=size)
+    elif kind == "cylinder":
+        bmesh.ops.create_cone(bm, cap_ends=True, segments=32, diameter1=radius, diameter2=radius, depth=size)
+    elif kind == "circle":
+        bmesh.ops.create_circle(bm, cap_ends=False, segments=32, radius=radius)
+    else:
+        raise ValueError("unknown primitive '{}', expected one of {}".format(kind, ", ".join(primitive_kinds)))
+
+
+def create_primitive_mesh(kind, name=None, size=2.0):
+    bm = bmesh.new()
+    try:
+        build_primitive(bm, kind, size)
+        mesh = bpy.data.meshes.new(name or "{}Mesh".format(default_name))
+        bm.to_mesh(mesh)
+    finally:
+        bm.free()
+    return mesh
+
+
+# mesh can be a bpy.types.Mesh, a name of an existing mesh or a primitive kind
+def resolve_mesh(mesh, name):
+    if isinstance(mesh, bpy.types.Mesh):
+        return mesh
+    if isinstance(mesh, bpy.types.Object):
+        return mesh.data
+    existing = bpy.data.meshes.get(mesh)
+    if existing is not None:
+        return existing
+    return create_primitive_mesh(mesh, "{}Mesh".format(name))
+
+
+def as_float_array(values, count, width, what):
+    if values is None:
+        return None
+    if not isinstance(values, array.array):
+        values = array.array("f", values)
+    expected = count * width
+    if len(values) != expected:
+        raise ValueError("{} must have {} values ({} per object), got {}".format(what, expected, width, len(values)))
+    return values
+
+
+def create_objects(mesh, count, locations=None, rotations=None, scales=None, name=None, collection=None,
+                   linked=True):
+    """Creates count objects sharing one mesh (or copies of it when linked is false), returns list of new objects.
+
+    locations, rotations (euler, radians) and scales are flat sequences of 3 floats per object."""
+    name = name or default_name
+    mesh = resolve_mesh(mesh, name)
+    locations = as_float_array(locations, count, 3, "locations")
+    rotations = as_float_array(rotations, count, 3, "rotations")
+    scales = as_float_array(scales, count, 3, "scales")
+
+    link_collection_at_end = collection is None
+    if link_collection_at_end:
+        collection = bpy.data.collections.new(name)
+    elif isinstance(collection, str):
+        collection = bpy.data.collections[collection]
+
+    objects_new = bpy.data.objects.new
+    link = collection.objects.link
+    digits = len(str(count))
+    objects = []
+    for i in range(count):
+        data = mesh if linked else mesh.copy()
+        ob = objects_new("{}.{}".format(name, str(i).zfill(digits)), data)
+        j = i * 3
+        if locations is not None:
+            ob.location = locations[j:j + 3]
+        if rotations is not None:
+            ob.rotation_euler = rotations[j:j + 3]
+        if scales is not None:
+            ob.scale = scales[j:j + 3]
+        link(ob)
+        objects.append(ob)
+
+    if link_collection_at_end:
+        bpy.context.scene.collection.children.link(collection)
+    return objects
+
+
+def create_vertex_instances(source, locations, name=None):
+    """Instances source object at given locations (flat, 3 floats per instance) using vertex instancing.
+
+    This creates just one extra object (the instancer), instances are not real objects, so it scales to large counts,
+    but instances cannot be transformed individually beyond their location."""
+    name = name or "{}Instancer".format(default_name)
+    locations = array.array("f", locations)
+    if len(locations) % 3 != 0:
+        raise ValueError("locations must have 3 values per instance, got {}".format(len(locations)))
+    mesh = bpy.data.meshes.new("{}Mesh".format(name))
+    mesh.vertices.add(len(locations) // 3)
+    mesh.vertices.foreach_set("co", locations)
+    mesh.update()
+    instancer = bpy.data.objects.new(name, mesh)
+    instancer.instance_type = 'VERTS'
+    bpy.context.scene.collection.objects.link(instancer)
+    source.parent = instancer
+    return instancer
+
+
+def remove_objects(objects, remove_meshes=True):
+    meshes = set()
+    if remove_meshes:
+        meshes = {ob.data for ob in objects if isinstance(ob.data, bpy.types.Mesh)}
+    bpy.data.batch_remove(list(objects))
+    # meshes might still be used by other objects
+    orphans = [mesh for mesh in meshes if mesh.users == 0]
+    if orphans:
+        bpy.data.batch_remove(orphans)
+
+
+def remove_collection(collection, remove_meshes=True):
+    if isinstance(collection, str):
+        collection = bpy.data.collections[collection]
+    remove_objects(list(collection.objects), remove_meshes)
+    bpy.data.collections.remove(collection)
+
+
+# -- js ---------------------------------------------------------------------------------------------------------------------
+
+def unpack_floats(data):
+    if data is None:
+        return None
+    values = arrays.make_buffer("f", 0)
+    values.frombytes(data.encode("latin-1"))
+    return values
+
+
+def create_objects_packed(mesh, count, locations, rotations, scales, name, collection, linked):
+    return create_objects(mesh, count, unpack_floats(locations), unpack_floats(rotations), unpack_floats(scales),
+                          name, collection, linked is not False)
+
+
+def create_vertex_instances_packed(source, locations, name):
+    return create_vertex_instances(source, unpack_floats(locations), name)
+
+
+js_prelude = """
+(function(bclj) {
+  function packFloats(values) {
+    if (values === undefined || values === null) {
+      return null;
+    }
+    if (!(values instanceof Float32Array)) {
+      values = new Float32Array(values);
+    }
+    return bclj.pack_typed_array(values);
+  }
+
+  bclj.create_objects = function(mesh, count, opts) {
+    opts = opts || {};
+    return bclj.create_objects_packed(mesh, count,
+                                      packFloats(opts.locations), packFloats(opts.rotations), packFloats(opts.scales),
+                                      opts.name || null, opts.collection || null, opts.linked);
+  };
+
+  bclj.create_vertex_instances = function(source, locations, name) {
+    return bclj.create_vertex_instances_packed(source, packFloats(locations), name || null);
+  };
+})(bclj);
+"""
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+from collections import deque
+
+from bclj import log, stats
+
+# console sink for js console.log/warn/error
+#
+# entries are written to stdout by the logging thread (see bclj.log.write), so a chatty js loop does not stall the UI
+# on terminal I/O and console lines keep their order relative to log records
+#
+# each level is rate limited (token bucket), messages over the limit are dropped and reported
+# as "N messages suppressed" on the next flush (once per pump tick)
+#
+# recent entries are kept in a ring buffer, they can be read back:
+#
+#   from js: bclj.console_entries(10, "error")
+#   from hy: (console.get-recent-entries 10 "error")
+#
+# env config:
+#   BCLJ_CONSOLE_SYNC             print every call immediately (useful when debugging crashes, combine with BCLJ_LOG_SYNC
+#                                 to keep order with log records)
+#   BCLJ_CONSOLE_HISTORY          number of recent entries to keep (default 1000)
+#   BCLJ_CONSOLE_RATE             sustained messages per second per level (default 100)
+#   BCLJ_CONSOLE_BURST            max burst of messages per level (default 500)
+
+sync = os.environ.get("BCLJ_CONSOLE_SYNC") is not None
+history_size = int(os.environ.get("BCLJ_CONSOLE_HISTORY", "1000"))
+rate = float(os.environ.get("BCLJ_CONSOLE_RATE", "100"))
+burst = float(os.environ.get("BCLJ_CONSOLE_BURST", "500"))
+
+levels = ("log", "warn", "error")
+
+level_prefixes = {"log": ("console.log", log.colorize_info),
+                  "warn": ("console.wrn", log.colorize_warning),
+                  "error": ("console.err", log.colorize_error)}
+
+
+class Entry(object):
+    __slots__ = ("seq", "time", "level", "args")
+
+    def __init__(self, seq, t, level, args):
+        self.seq = seq
+        self.time = t
+        self.level = level
+        self.args = args
+
+    def as_dict(self):
+        return {"seq": self.seq,
+                "time": self.time,
+                "level": self.level,
+                "message": " ".join(self.args)}
+
+    # called on the logging thread
+    def __str__(self):
+        return format_entry(self)
+
+
+class RateLimiter(object):
+    __slots__ = ("tokens", "updated_at", "suppressed")
+
+    def __init__(self):
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.suppressed = 0
+
+    def allow(self, now):
+        self.tokens = min(burst, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+history = deque(maxlen=history_size)
+limiters = {level: RateLimiter() for level in levels}
+next_seq = 1
+
+console_stats = {
+    "messages": 0,
+    "suppressed": 0,
+}
+
+
+def get_console_stats():
+    return dict(console_stats)
+
+
+stats.register_provider("console", get_console_stats)
+
+
+def indent_arg(arg):
+    return arg.replace("\n", "\n            ")
+
+
+def format_entry(entry):
+    prefix, colorize = level_prefixes[entry.level]
+    return " ".join([colorize(prefix)] + [indent_arg(arg) for arg in entry.args])
+
+
+def format_suppressed(level, count):
+    prefix, colorize = level_prefixes[level]
+    return "{} {}".format(colorize(prefix), log.colorize_gray("... {} messages suppressed".format(count)))
+
+
+def write_lines(lines):
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+# -- API --------------------------------------------------------------------------------------------------------------------
+
+# args are converted to strings right away, js objects may change or go away before flush
+def add(level, args):
+    global next_seq
+    limiter = limiters[level]
+    if not limiter.allow(time.monotonic()):
+        console_stats["suppressed"] += 1
+        return
+    entry = Entry(next_seq, time.time(), level, [str(arg) for arg in args])
+    next_seq += 1
+    console_stats["messages"] += 1
+    history.append(entry)
+    if sync:
+        write_lines([format_entry(entry)])
+    else:
+        log.write(entry)
+
+
+# called once per pump tick
+def flush():
+    for level, limiter in limiters.items():
+        if limiter.suppressed:
+            log.write(format_suppressed(level, limiter.suppressed))
+            limiter.suppressed = 0
+
+
+# reports pending suppressed messages, writing out is finished by log.shutdown
+def shutdown():
+    flush()
+
+
+def get_recent_entries(n=None, level=None):
+    entries = [entry for entry in history if level is None or entry.level == level]
+    if n is not None:
+        # note: entries[-0:] would be the whole list
+        entries = entries[max(0, len(entries) - n):] if n > 0 else []
+    return [entry.as_dict() for entry in entries]
+
+
+def get_recent_entries_json(n=None, level=None):
+    return json.dumps(get_recent_entries(n, level))
+
+
+def clear():
+    history.clear()
+
+
+js_prelude = """
+(function(bclj) {
+  bclj.console_entries = function(n, level) {
+    return JSON.parse(bclj.console_entries_json(n, level));
+  };
+})(bclj);
+"""
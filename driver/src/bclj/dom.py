@@ -0,0 +1,347 @@
+import os
+from html import escape
+from html.parser import HTMLParser
+
+# minimal native DOM tree used by the thug shim
+#
+# we only need a small tree which shadow-cljs and goog.dom can poke at, so instead of BeautifulSoup/lxml we keep
+# compact __slots__ based nodes and parse html fragments with the stdlib parser,
+# node classes mimic the subset of bs4 API used by thug (contents, parent, siblings, attrs, append/insert/extract...)
+#
+# the bs4 backend is still available, see dom_bs4.py
+#
+# env config:
+#   BCLJ_DOM_BACKEND              "native" (default) or "bs4"
+
+backend_name = os.environ.get("BCLJ_DOM_BACKEND", "native")
+
+void_elements = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+                           "source", "track", "wbr"])
+
+raw_text_elements = frozenset(["script", "style"])
+
+
+class PageElement(object):
+    # sibling links are kept in sync by Tag.insert/extract/clear, so walking child lists is O(1) per step like in bs4
+    __slots__ = ("parent", "next_sibling", "previous_sibling", "wrapper_ref", "__weakref__")
+
+    def __init__(self):
+        self.parent = None
+        self.next_sibling = None
+        self.previous_sibling = None
+        self.wrapper_ref = None
+
+    def extract(self):
+        parent = self.parent
+        if parent is not None:
+            del parent.contents[parent.index(self)]
+            previous_sibling = self.previous_sibling
+            next_sibling = self.next_sibling
+            if previous_sibling is not None:
+                previous_sibling.next_sibling = next_sibling
+            if next_sibling is not None:
+                next_sibling.previous_sibling = previous_sibling
+            self.parent = None
+            self.next_sibling = None
+            self.previous_sibling = None
+        return self
+
+
+class NavigableString(PageElement):
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        PageElement.__init__(self)
+        self.text = str(text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return repr(self.text)
+
+    def __len__(self):
+        return len(self.text)
+
+    def __getitem__(self, key):
+        return self.text[key]
+
+    def __add__(self, other):
+        return self.text + str(other)
+
+    def __eq__(self, other):
+        return self.text == str(other)
+
+    def __hash__(self):
+        return id(self)
+
+    def output_ready(self, formatter=None):
+        return self.text
+
+
+class Tag(PageElement):
+    __slots__ = ("name", "attrs", "contents")
+
+    def __init__(self, name, attrs=None):
+        PageElement.__init__(self)
+        self.name = name
+        self.attrs = attrs if attrs is not None else {}
+        self.contents = []
+
+    def __bool__(self):
+        return True
+
+    def __len__(self):
+        return len(self.contents)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def __setitem__(self, key, value):
+        self.attrs[key] = value
+
+    def __delitem__(self, key):
+        self.attrs.pop(key, None)
+
+    def __str__(self):
+        return serialize(self)
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self.name)
+
+    def has_attr(self, key):
+        return key in self.attrs
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    @property
+    def children(self):
+        return iter(self.contents)
+
+    def index(self, element):
+        if element.parent is self:
+            # fast paths for appending and re-appending
+            if element.next_sibling is None:
+                return len(self.contents) - 1
+            if element.previous_sibling is None:
+                return 0
+        for i, child in enumerate(self.contents):
+            if child is element:
+                return i
+        raise ValueError("element is not a child of this tag")
+
+    def insert(self, position, element):
+        if isinstance(element, str):
+            element = NavigableString(element)
+        if element.parent is self:
+            current = self.index(element)
+            if current < position:
+                position -= 1
+        element.extract()
+        contents = self.contents
+        # clamp the same way list.insert does
+        count = len(contents)
+        if position < 0:
+            position = max(0, count + position)
+        position = min(position, count)
+        previous_sibling = contents[position - 1] if position > 0 else None
+        next_sibling = contents[position] if position < count else None
+        contents.insert(position, element)
+        element.parent = self
+        element.previous_sibling = previous_sibling
+        element.next_sibling = next_sibling
+        if previous_sibling is not None:
+            previous_sibling.next_sibling = element
+        if next_sibling is not None:
+            next_sibling.previous_sibling = element
+
+    def append(self, element):
+        self.insert(len(self.contents), element)
+
+    def clear(self):
+        for child in self.contents:
+            child.parent = None
+            child.next_sibling = None
+            child.previous_sibling = None
+        del self.contents[:]
+
+    @property
+    def string(self):
+        if len(self.contents) != 1:
+            return None
+        child = self.contents[0]
+        if isinstance(child, NavigableString):
+            return child
+        return child.string
+
+    @string.setter
+    def string(self, text):
+        self.clear()
+        self.append(NavigableString(text))
+
+    @property
+    def descendants(self):
+        stack = list(reversed(self.contents))
+        while stack:
+            node = stack.pop()
+            yield node
+            if isinstance(node, Tag):
+                stack.extend(reversed(node.contents))
+
+    def _matches(self, name, attrs):
+        if name is not True and name is not None and self.name != name:
+            return False
+        if attrs:
+            for key, value in attrs.items():
+                if self.attrs.get(key) != value:
+                    return False
+        return True
+
+    def find_all(self, name=True, attrs=None):
+        return [node for node in self.descendants if isinstance(node, Tag) and node._matches(name, attrs)]
+
+    def find(self, name=True, attrs=None):
+        for node in self.descendants:
+            if isinstance(node, Tag) and node._matches(name, attrs):
+                return node
+        return None
+
+    # all tags following this one in document order
+    def find_all_next(self, name=True, attrs=None):
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        result = []
+        seen_self = False
+        for node in root.descendants:
+            if node is self:
+                seen_self = True
+            elif seen_self and isinstance(node, Tag) and node._matches(name, attrs):
+                result.append(node)
+        return result
+
+
+class Document(Tag):
+    # note: not named "index", that would shadow Tag.index()
+    __slots__ = ("element_index",)
+
+    def __init__(self):
+        Tag.__init__(self, "[document]")
+        self.element_index = None
+
+    def __str__(self):
+        return "".join(str(child) if isinstance(child, Tag) else serialize_text(child, None) for child in self.contents)
+
+
+# -- serialization ----------------------------------------------------------------------------------------------------------
+
+def serialize_text(node, parent_name):
+    if parent_name in raw_text_elements:
+        return node.text
+    return escape(node.text, quote=False)
+
+
+def serialize_attrs(attrs):
+    parts = []
+    for key, value in attrs.items():
+        if value is None:
+            parts.append(" " + key)
+        else:
+            parts.append(' {}="{}"'.format(key, escape(str(value), quote=True)))
+    return "".join(parts)
+
+
+def serialize(tag):
+    parts = ["<", tag.name, serialize_attrs(tag.attrs), ">"]
+    if tag.name in void_elements and not tag.contents:
+        return "".join(parts)
+    for child in tag.contents:
+        if isinstance(child, Tag):
+            parts.append(serialize(child))
+        else:
+            parts.append(serialize_text(child, tag.name))
+    parts.append("</{}>".format(tag.name))
+    return "".join(parts)
+
+
+# -- parsing ----------------------------------------------------------------------------------------------------------------
+
+class FragmentParser(HTMLParser):
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.root = Tag("[fragment]")
+        self.stack = [self.root]
+
+    def handle_starttag(self, name, attrs):
+        tag = Tag(name, dict(attrs))
+        self.stack[-1].append(tag)
+        if name not in void_elements:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, name, attrs):
+        self.stack[-1].append(Tag(name, dict(attrs)))
+
+    def handle_endtag(self, name):
+        # tolerate unbalanced markup, close up to the nearest matching open tag
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].name == name:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        parent = self.stack[-1]
+        if parent.contents and isinstance(parent.contents[-1], NavigableString):
+            parent.contents[-1].text += data
+        else:
+            parent.append(NavigableString(data))
+
+
+def parse_fragment(html):
+    parser = FragmentParser()
+    parser.feed(html)
+    parser.close()
+    nodes = list(parser.root.contents)
+    parser.root.clear()
+    return nodes
+
+
+# -- backend API ------------------------------------------------------------------------------------------------------------
+
+def create_document():
+    return Document()
+
+
+def create_html_document(title=None):
+    doc = Document()
+    html = Tag("html")
+    head = Tag("head")
+    if title:
+        title_tag = Tag("title")
+        title_tag.string = title
+        head.append(title_tag)
+    html.append(head)
+    html.append(Tag("body"))
+    doc.append(html)
+    return doc
+
+
+def create_element(doc, name):
+    return Tag(name)
+
+
+def get_wrapper_ref(node):
+    return node.wrapper_ref
+
+
+def set_wrapper_ref(node, ref):
+    node.wrapper_ref = ref
+
+
+def get_index(doc):
+    return doc.element_index
+
+
+def set_index(doc, index):
+    doc.element_index = index
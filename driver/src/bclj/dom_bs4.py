@@ -0,0 +1,53 @@
+import bs4
+from lxml.html import builder as E
+from lxml.html import tostring
+
+# BeautifulSoup/lxml backend for the thug DOM shim, enabled with BCLJ_DOM_BACKEND=bs4, see dom.py
+
+backend_name = "bs4"
+
+PageElement = bs4.element.PageElement
+NavigableString = bs4.NavigableString
+Tag = bs4.Tag
+Document = bs4.BeautifulSoup
+
+# note: we go through __dict__ because bs4.Tag.__getattr__ treats unknown attributes as child tag lookups
+wrapper_attr = "_bclj_wrapper"
+index_attr = "_bclj_index"
+
+
+def parse_fragment(html):
+    return list(bs4.BeautifulSoup(html, "html.parser").contents)
+
+
+def create_document():
+    return bs4.BeautifulSoup('', 'lxml')
+
+
+def create_html_document(title=None):
+    body = E.BODY()
+    title = E.TITLE(title) if title else ""
+    head = E.HEAD(title)
+    html = E.HTML(head, body)
+
+    return bs4.BeautifulSoup(tostring(html, doctype='<!doctype html>'), "lxml")
+
+
+def create_element(doc, name):
+    return bs4.Tag(parser=doc, name=name)
+
+
+def get_wrapper_ref(node):
+    return node.__dict__.get(wrapper_attr)
+
+
+def set_wrapper_ref(node, ref):
+    node.__dict__[wrapper_attr] = ref
+
+
+def get_index(doc):
+    return doc.__dict__.get(index_attr)
+
+
+def set_index(doc, index):
+    doc.__dict__[index_attr] = index
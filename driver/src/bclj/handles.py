@@ -0,0 +1,64 @@
+import sys
+import logging
+import importlib
+
+from bclj import stats
+
+logger = logging.getLogger(__name__)
+
+# bound handles for python callables addressed by a dotted path, e.g. "bpy.ops.mesh.primitive_cube_add"
+#
+# evaluating such path in js walks STPyV8 proxies level by level and bpy.ops creates a fresh wrapper object
+# for each attribute access, a bound handle resolves the path once and can be passed to bclj.pycall directly
+#
+# handles pin the resolved object, so bind only stable paths (modules, operators, functions),
+# not things like bpy.context.active_object
+#
+# usage from js:
+#
+#   var cube_add = bclj.bind("bpy.ops.mesh.primitive_cube_add");
+#   bclj.pycall(cube_add, null, {location: [0, 0, 0]});
+
+handles = {}
+
+handles_stats = {
+    "binds": 0,
+    "resolves": 0,
+}
+
+
+def get_handles_stats():
+    res = dict(handles_stats)
+    res["bound"] = len(handles)
+    return res
+
+
+stats.register_provider("handles", get_handles_stats)
+
+
+def resolve(path):
+    parts = path.split(".")
+    o = sys.modules.get(parts[0])
+    if o is None:
+        o = importlib.import_module(parts[0])
+    for part in parts[1:]:
+        o = getattr(o, part)
+    return o
+
+
+def bind(path):
+    handles_stats["binds"] += 1
+    handle = handles.get(path)
+    if handle is None:
+        handles_stats["resolves"] += 1
+        try:
+            handle = resolve(path)
+        except AttributeError as e:
+            raise AttributeError("unable to bind '{}': {}".format(path, e))
+        handles[path] = handle
+    return handle
+
+
+# operators or addons might get re-registered, we drop all handles on page reload
+def clear():
+    handles.clear()
@@ -1,41 +1,167 @@
+import os
+import math
+import codecs
 import logging
 import asyncio
 import threading
+import time
 
 import aiohttp
-from aiohttp import ClientResponse
 
-from bclj import v8, autils
+from bclj import log, v8, autils, stats
 
 logger = logging.getLogger(__name__)
 
 async_loop: asyncio.AbstractEventLoop
 
+# connection pool settings for the shared client session
+connection_limit = 32
+connection_limit_per_host = 8
+keepalive_timeout = 30
+dns_cache_ttl = 300
+
+# response bodies are read in chunks, each chunk is delivered to js as a progress event
+response_chunk_size = 64 * 1024
+
+default_max_response_mb = 512
+
+
+def read_max_response_size():
+    value = os.environ.get("BCLJ_HTTP_MAX_RESPONSE_MB")
+    if value is None:
+        return default_max_response_mb * 1024 * 1024
+    try:
+        size_mb = float(value)
+    except ValueError:
+        size_mb = None
+    if size_mb is None or not math.isfinite(size_mb) or size_mb <= 0:
+        logger.warning("ignoring invalid BCLJ_HTTP_MAX_RESPONSE_MB '{}', expected a positive number of megabytes, "
+                       "using {}".format(value, default_max_response_mb))
+        size_mb = default_max_response_mb
+    return int(size_mb * 1024 * 1024)
+
+
+# responses over this size get aborted with an error
+max_response_size = read_max_response_size()
+
+# all XMLHttpRequest instances share one pooled session living in async_loop
+client_session = None
+
+connection_stats = {
+    "new": 0,
+    "reused": 0,
+}
+
 
 def start_async_loop_if_needed():
     if "async_loop" not in globals():
         global async_loop
-        async_loop = autils.start_async_loop(__name__)
+        async_loop = autils.get_io_loop()
+        autils.register_io_loop_shutdown_hook(close_client_session)
+
+
+async def on_connection_create_end(_session, _ctx, _params):
+    connection_stats["new"] += 1
+
+
+async def on_connection_reuseconn(_session, _ctx, _params):
+    connection_stats["reused"] += 1
+
+
+def create_trace_config():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+def create_client_session():
+    connector = aiohttp.TCPConnector(limit=connection_limit,
+                                     limit_per_host=connection_limit_per_host,
+                                     keepalive_timeout=keepalive_timeout,
+                                     use_dns_cache=True,
+                                     ttl_dns_cache=dns_cache_ttl)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[create_trace_config()])
+
+
+# must be called from async_loop
+def get_client_session():
+    global client_session
+    if client_session is None or client_session.closed:
+        logger.debug("creating pooled HTTP client session")
+        client_session = create_client_session()
+    return client_session
+
+
+async def close_client_session():
+    global client_session
+    if client_session is not None:
+        session = client_session
+        client_session = None
+        await session.close()
+        logger.debug(log.fmt("closed pooled HTTP client session, connection stats: {}", get_connection_stats()))
+
+
+def get_connection_stats():
+    return dict(connection_stats)
+
+
+stats.register_provider("http", get_connection_stats)
 
 
-async def dispatch_http_method(session, method, *args, **kwargs):
-    return await getattr(session, method.lower())(*args, **kwargs)
+def do_http_request(session, method, url, headers, data):
+    return session.request(method, url, headers=headers, data=data)
 
 
-async def do_http_request(session, method, url, headers, data):
-    response: ClientResponse = await dispatch_http_method(session, method, url, headers=headers, data=data)
-    return response
+class ResponseTooLarge(Exception):
+    pass
 
 
-def abbreviate_message_for_log(msg):
-    if len(msg) > 300:
-        return msg[:300] + "...}"
-    else:
-        return msg
+class ProgressEvent(v8.JSClass):
+
+    def __init__(self, event_type, loaded=0, total=0):
+        super().__init__()
+        self.type = event_type
+        self.loaded = loaded
+        self.total = total or 0
+        self.lengthComputable = bool(total)
+
+
+# binary responses are not decoded, each chunk crosses to js as a "binary string" (latin-1) and gets copied
+# into an ArrayBuffer which is preallocated when content length is known,
+# so the body is never held in full on python side
+js_prelude = """
+(function(bclj) {
+  bclj.http_buffer_write = function(buffer, offset, data, capacity) {
+    var needed = offset + data.length;
+    if (buffer === null || buffer.byteLength < needed) {
+      var size = Math.max(needed, capacity || 0, buffer === null ? 0 : buffer.byteLength * 2);
+      var grown = new ArrayBuffer(size);
+      if (buffer !== null) {
+        new Uint8Array(grown).set(new Uint8Array(buffer, 0, offset));
+      }
+      buffer = grown;
+    }
+    var bytes = new Uint8Array(buffer, offset, data.length);
+    for (var i = 0; i < data.length; i++) {
+      bytes[i] = data.charCodeAt(i);
+    }
+    return buffer;
+  };
+
+  bclj.http_buffer_finish = function(buffer, length) {
+    if (buffer === null) {
+      return new ArrayBuffer(0);
+    }
+    return buffer.byteLength === length ? buffer : buffer.slice(0, length);
+  };
+})(bclj);
+"""
 
 
 # note that this is not full XMLHttpRequest implementation,
-# we implement only what is currently needed for shadow-cljs to work
+# we implement only what is currently needed for shadow-cljs to work,
+# plus progressive delivery of responses (responseText grows with each onprogress), responseType "arraybuffer" and abort()
 # noinspection PyPep8Naming
 class XMLHttpRequest(object):
     READY_STATE_UNSENT = 0  # Client has been created. open() not called yet.
@@ -45,32 +171,127 @@ class XMLHttpRequest(object):
     READY_STATE_DONE = 4  # The operation is complete.
 
     async def _process_onreadystatechange(self):
-        if self.onreadystatechange is not None:
-            v8.execute_callback(self._window.context, self.onreadystatechange)
+        self._dispatch("onreadystatechange")
 
     def _change_ready_state(self, new_state):
         self.readyState = new_state
         autils.call_soon(self._main_loop, self._process_onreadystatechange)
 
-    async def _send_request(self, body):
+    # -- main loop side -----------------------------------------------------------------------------------------------------
+
+    def _dispatch(self, handler_name, *args):
+        handler = getattr(self, handler_name, None)
+        # window might have been torn down by a page reload in the meantime
+        if handler is not None and self._window.context is not None:
+            return v8.execute_callback(self._window.context, handler, *args)
+
+    def _call_js_helper(self, name, *args):
+        return v8.execute_callback(self._window.context, getattr(self._window.bclj, name), *args)
+
+    def _set_ready_state(self, new_state):
+        self.readyState = new_state
+        self._dispatch("onreadystatechange")
+
+    def _is_current(self, request_id):
+        return request_id == self._request_id and self._window.context is not None
+
+    def _on_headers(self, request_id, status, reason, url, total):
+        if not self._is_current(request_id):
+            return
+        self.status = status
+        self.statusText = reason
+        self.responseURL = url
+        self._total = total
+        self._set_ready_state(self.READY_STATE_HEADERS_RECEIVED)
+
+    def _on_chunk(self, request_id, data, loaded):
+        if not self._is_current(request_id):
+            return
+        if self.responseType == "arraybuffer":
+            self._buffer = self._call_js_helper("http_buffer_write", self._buffer, self._loaded, data, self._total)
+        else:
+            self._text_parts.append(data)
+        self._loaded = loaded
+        if self.readyState != self.READY_STATE_LOADING:
+            self._set_ready_state(self.READY_STATE_LOADING)
+        else:
+            self._dispatch("onreadystatechange")
+        self._dispatch("onprogress", ProgressEvent("progress", loaded, self._total))
+
+    def _on_done(self, request_id):
+        if not self._is_current(request_id):
+            return
+        if self.responseType == "arraybuffer":
+            self._response = self._call_js_helper("http_buffer_finish", self._buffer, self._loaded)
+            self._buffer = None
+        self._request_future = None
+        self._set_ready_state(self.READY_STATE_DONE)
+        self._dispatch("onload", ProgressEvent("load", self._loaded, self._total))
+        self._dispatch("onloadend", ProgressEvent("loadend", self._loaded, self._total))
+        if stats.enabled:
+            stats.record("http.send_to_done", time.perf_counter() - self._sent_at)
+
+    def _on_error(self, request_id, message):
+        if not self._is_current(request_id):
+            return
+        logger.error("HTTP request to '{}' failed: {}".format(self._url, message))
+        self._reset_response()
+        self._request_future = None
+        self._set_ready_state(self.READY_STATE_DONE)
+        self._dispatch("onerror", ProgressEvent("error"))
+        self._dispatch("onloadend", ProgressEvent("loadend"))
+
+    def _reset_response(self):
+        self.status = 0
+        self.statusText = ""
+        self._text_parts = []
+        self._buffer = None
+        self._response = None
+        self._loaded = 0
+        self._total = 0
+
+    # -- async_loop side ----------------------------------------------------------------------------------------------------
+
+    async def _send_request(self, request_id, body):
         url = self._url
         method = self._method
         headers = self._headers
-        logger.debug("Sending HTTP {} request {} (body length={})\n{}".format(method, url, len(body),
-                                                                              abbreviate_message_for_log(body)))
-        async with aiohttp.ClientSession() as session:
-            response = await do_http_request(session, method, url, headers, body)
-            self.status = response.status
-            self.statusText = response.reason
-            self.responseURL = response.url
-
-            self._change_ready_state(self.READY_STATE_HEADERS_RECEIVED)
-            self._change_ready_state(self.READY_STATE_LOADING)
-
-            self.responseText = await response.text()
-            self.response = self.responseText
-            logger.debug("got response {}".format(abbreviate_message_for_log(self.response)))
-            self._change_ready_state(self.READY_STATE_DONE)
+        binary = self.responseType == "arraybuffer"
+        post = self._main_loop.call_soon_threadsafe
+        logger.debug(log.fmt("Sending HTTP {} request {} (body length={})\n{}", method, url, len(body),
+                             log.abbreviated(body)))
+        session = get_client_session()
+        try:
+            # leaving the context releases the connection back into the pool for keep-alive reuse
+            async with do_http_request(session, method, url, headers, body) as response:
+                total = response.content_length
+                if total is not None and total > max_response_size:
+                    raise ResponseTooLarge("content length {} exceeds the limit of {} bytes".format(total,
+                                                                                                   max_response_size))
+                post(self._on_headers, request_id, response.status, response.reason, str(response.url), total)
+
+                decoder = None
+                if not binary:
+                    decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+                loaded = 0
+                async for chunk in response.content.iter_chunked(response_chunk_size):
+                    loaded += len(chunk)
+                    if loaded > max_response_size:
+                        raise ResponseTooLarge("response exceeds the limit of {} bytes".format(max_response_size))
+                    data = chunk.decode("latin-1") if binary else decoder.decode(chunk)
+                    if data:
+                        post(self._on_chunk, request_id, data, loaded)
+                if decoder is not None:
+                    data = decoder.decode(b"", final=True)
+                    if data:
+                        post(self._on_chunk, request_id, data, loaded)
+                logger.debug(log.fmt("got response {} ({} bytes)", url, loaded))
+                post(self._on_done, request_id)
+        except asyncio.CancelledError:
+            # aborted, leaving the context closed the connection
+            logger.debug(log.fmt("request {} cancelled", url))
+        except Exception as e:
+            post(self._on_error, request_id, str(e))
 
     @v8.report_exceptions
     def __init__(self):
@@ -83,20 +304,40 @@ class XMLHttpRequest(object):
         self._headers = {}
         self._method = None
         self._url = None
+        self._sent_at = None
+        self._request_id = 0
+        self._request_future = None
+        self._reset_response()
 
         self.onreadystatechange = None
-        self.status = 0
-        self.statusText = ""
+        self.onprogress = None
+        self.onload = None
+        self.onerror = None
+        self.onabort = None
+        self.onloadend = None
         self.readyState = self.READY_STATE_UNSENT
         self.responseType = "text"
-        self.response = ""
-        self.responseText = ""
         self.responseURL = ""
         self.withCredentials = False
 
+    # text parts are joined lazily, only when js asks for them
+    @property
+    def responseText(self):
+        if self.responseType == "arraybuffer":
+            return ""
+        if len(self._text_parts) > 1:
+            self._text_parts = ["".join(self._text_parts)]
+        return self._text_parts[0] if self._text_parts else ""
+
+    @property
+    def response(self):
+        if self.responseType == "arraybuffer":
+            return self._response if self.readyState == self.READY_STATE_DONE else None
+        return self.responseText
+
     @v8.report_exceptions
     def open(self, method=None, url=None, asyn=None, user=None, password=None, *_):
-        logger.debug("open method={} url={} asyn={}".format(method, url, asyn))
+        logger.debug(log.fmt("open method={} url={} asyn={}", method, url, asyn))
         assert asyn
         self._method = method
         self._url = url
@@ -104,15 +345,31 @@ class XMLHttpRequest(object):
 
     @v8.report_exceptions
     def setRequestHeader(self, header=None, value=None, *_):
-        logger.debug("setRequestHeader header={} value={}".format(header, value))
+        logger.debug(log.fmt("setRequestHeader header={} value={}", header, value))
         self._headers[header] = value
 
     @v8.report_exceptions
     def send(self, body=None, *_):
-        logger.debug("send {}".format(body))
-        assert isinstance(body, str)
-        autils.call_soon(async_loop, self._send_request, body)
+        logger.debug(log.fmt("send {}", log.abbreviated(body)))
+        assert body is None or isinstance(body, str)
+        self._request_id += 1
+        self._reset_response()
+        self._sent_at = time.perf_counter()
+        self._request_future = autils.call_soon(async_loop, self._send_request, self._request_id, body or "")
 
     @v8.report_exceptions
     def abort(self, *_):
-        logger.debug("abort")
+        logger.debug(log.fmt("abort {}", self._url))
+        future = self._request_future
+        if future is None:
+            return
+        self._request_future = None
+        # invalidates results still queued for the main loop
+        self._request_id += 1
+        # cancels the task in async_loop, which closes the connection
+        future.cancel()
+        self._reset_response()
+        self._set_ready_state(self.READY_STATE_DONE)
+        self._dispatch("onabort", ProgressEvent("abort"))
+        self._dispatch("onloadend", ProgressEvent("loadend"))
+        self.readyState = self.READY_STATE_UNSENT
@@ -1,16 +1,21 @@
 import asyncio
+import builtins
+import hashlib
 import os
 import sys
+import time
+import types
 import logging
 import threading
 
-from bclj import log, backtrace, autils
+from bclj import log, backtrace, autils, watcher, stats
 
 hy_enabled = os.environ.get("BCLJ_HY_SUPPORT") is not None
 
 if hy_enabled:
-    from hy.importer import runhy
-    from bclj import hyrepl
+    from hy.lex import hy_parse
+    from hy.compiler import hy_compile
+    from bclj import hyrepl, hydeps
 
 hyrepl_enabled = hy_enabled and os.environ.get("BCLJ_HYLANG_NREPL") is not None
 
@@ -26,7 +31,53 @@ else:
         if not os.path.exists(live_file_path):
             logger.warning("live file '%s' does not exists" % live_file_path)
 
-live_file_last_mtime = 0
+# directories with user code, changes to modules imported from there trigger live file reload
+live_file_roots = [root for root in [os.path.dirname(live_file_path) if live_file_path else None,
+                                     os.environ.get("BCLJ_HYLIB_DIR")] if root]
+
+live_file_watcher = None
+live_file_import_graph = {}
+
+# per-frame mode: when the live file defines (defn on-frame [frame] ...), the file is executed only when it changes
+# and on-frame gets called on each frame change instead of re-executing the whole file
+#
+# env config:
+#   BCLJ_HY_FRAME_BUDGET_MS       time budget for on-frame (default is frame duration given by scene fps)
+#   BCLJ_HY_FRAME_POLICY          what to do during playback when on-frame does not keep up:
+#                                   "skip" (default) - skip frames until the overrun is paid off
+#                                   "coalesce" - defer on-frame to the event loop, only the latest pending frame runs
+#                                   "none" - call on-frame on every frame
+
+live_file_on_frame = None
+
+frame_budget = os.environ.get("BCLJ_HY_FRAME_BUDGET_MS")
+if frame_budget is not None:
+    frame_budget = float(frame_budget) / 1000
+frame_policy = os.environ.get("BCLJ_HY_FRAME_POLICY", "skip")
+
+overrun_warning_interval = 1.0
+
+# accumulated time by which on-frame calls overran their budget
+frame_debt = 0.0
+pending_frame = None
+last_overrun_warning_at = None
+overruns_since_warning = 0
+
+live_file_stats = {
+    "compiles": 0,
+    "last_compile_time": 0.0,
+    "total_compile_time": 0.0,
+    "execs": 0,
+    "last_exec_time": 0.0,
+    "max_exec_time": 0.0,
+    "total_exec_time": 0.0,
+    "frames": 0,
+    "skipped_frames": 0,
+    "coalesced_frames": 0,
+    "frame_overruns": 0,
+    "last_frame_time": 0.0,
+    "max_frame_time": 0.0,
+}
 
 hyrepl_server = None
 
@@ -63,17 +114,98 @@ def stop_hyrepl():
         hyrepl_server = None
 
 
+class CompiledHyFile(object):
+
+    def __init__(self, stamp, digest, code):
+        self.stamp = stamp
+        self.digest = digest
+        self.code = code
+
+
+# path -> CompiledHyFile, code objects are re-used until file's mtime or content changes
+compiled_hy_files = {}
+
+
+def get_file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def compile_hy_source(source, path):
+    tree = hy_parse(source, filename=path)
+    # macros get required into this module during compilation
+    module = types.ModuleType("__main__")
+    module.__file__ = path
+    ast = hy_compile(tree, module, filename=path, source=source)
+    return compile(ast, path, "exec")
+
+
+def get_compiled_hy_file(path):
+    stamp = get_file_stamp(path)
+    compiled = compiled_hy_files.get(path)
+    if compiled is not None and compiled.stamp == stamp:
+        return compiled.code
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if compiled is not None and compiled.digest == digest:
+        compiled.stamp = stamp
+        return compiled.code
+
+    start = time.perf_counter()
+    code = compile_hy_source(data.decode("utf-8"), path)
+    elapsed = time.perf_counter() - start
+    live_file_stats["compiles"] += 1
+    live_file_stats["last_compile_time"] = elapsed
+    live_file_stats["total_compile_time"] += elapsed
+    logger.debug("compiled '{}' in {:.2f}ms".format(path, elapsed * 1000))
+    compiled_hy_files[path] = CompiledHyFile(stamp, digest, code)
+    return code
+
+
+# returns globals of the executed code
+def exec_compiled_hy_code(code, path):
+    # mimic runpy.run_path(path, run_name='__main__'), each run gets fresh globals
+    run_globals = {
+        "__name__": "__main__",
+        "__file__": path,
+        "__builtins__": builtins,
+    }
+    start = time.perf_counter()
+    try:
+        exec(code, run_globals)
+    finally:
+        elapsed = time.perf_counter() - start
+        live_file_stats["execs"] += 1
+        live_file_stats["last_exec_time"] = elapsed
+        live_file_stats["max_exec_time"] = max(live_file_stats["max_exec_time"], elapsed)
+        live_file_stats["total_exec_time"] += elapsed
+        logger.debug("executed '{}' in {:.2f}ms".format(path, elapsed * 1000))
+    return run_globals
+
+
+# returns globals of the executed file or None on failure
 def exec_hy_file(path):
     try:
-        runhy.run_path(path, run_name='__main__')
+        return exec_compiled_hy_code(get_compiled_hy_file(path), path)
     except Exception:
         backtrace.present_hy_exception(*sys.exc_info())
+        return None
 
 
 def run_hylang_file(path):
     logger.info("Reloading '{}' ".format(log.colorize_file(path)))
-    exec_hy_file(path)
+    run_globals = exec_hy_file(path)
     logger.info("Done executing '{}'".format(path))
+    return run_globals
+
+
+def get_live_file_stats():
+    return dict(live_file_stats)
+
+
+stats.register_provider("hy_live_file", get_live_file_stats)
 
 
 def has_live_file():
@@ -90,16 +222,142 @@ def log_live_file_watching_stop():
         logger.info("Finished watching '{}'".format(log.colorize_file(live_file_path)))
 
 
-def run_live_file():
-    if has_live_file():
-        run_hylang_file(live_file_path)
+# -- per-frame mode ---------------------------------------------------------------------------------------------------------
+
+def update_live_file_on_frame(run_globals):
+    global live_file_on_frame, frame_debt, pending_frame
+    if run_globals is None:
+        # failed to execute, keep the previous on-frame (if any) running
+        return
+    on_frame = run_globals.get("on_frame")
+    if on_frame is not None and not callable(on_frame):
+        logger.warning("on-frame defined in live file is not callable, ignoring it")
+        on_frame = None
+    if (on_frame is None) != (live_file_on_frame is None):
+        if on_frame is not None:
+            logger.info("Live file defines on-frame, calling it on frame changes")
+        else:
+            logger.info("Live file does not define on-frame, re-executing it on frame changes")
+    live_file_on_frame = on_frame
+    frame_debt = 0.0
+    pending_frame = None
+
+
+def report_frame_overrun(elapsed, budget):
+    global last_overrun_warning_at, overruns_since_warning
+    live_file_stats["frame_overruns"] += 1
+    overruns_since_warning += 1
+    now = time.perf_counter()
+    if last_overrun_warning_at is not None and now - last_overrun_warning_at < overrun_warning_interval:
+        return
+    logger.warning("on-frame took {:.1f}ms, over the budget of {:.1f}ms ({} overrun(s) since last warning, "
+                   "{} frame(s) skipped so far)".format(elapsed * 1000, budget * 1000, overruns_since_warning,
+                                                        live_file_stats["skipped_frames"]))
+    last_overrun_warning_at = now
+    overruns_since_warning = 0
+
+
+def call_on_frame(frame, budget):
+    global frame_debt
+    start = time.perf_counter()
+    try:
+        live_file_on_frame(frame)
+    except Exception:
+        backtrace.present_hy_exception(*sys.exc_info())
+    elapsed = time.perf_counter() - start
+    live_file_stats["frames"] += 1
+    live_file_stats["last_frame_time"] = elapsed
+    live_file_stats["max_frame_time"] = max(live_file_stats["max_frame_time"], elapsed)
+    frame_debt = max(0.0, frame_debt + elapsed - budget)
+    if elapsed > budget:
+        report_frame_overrun(elapsed, budget)
+
+
+def process_pending_frame():
+    global pending_frame
+    if pending_frame is None or live_file_on_frame is None:
+        return
+    frame, budget = pending_frame
+    pending_frame = None
+    call_on_frame(frame, budget)
+
+
+def schedule_frame(frame, budget):
+    global pending_frame
+    if pending_frame is not None:
+        live_file_stats["coalesced_frames"] += 1
+    else:
+        main_loop.call_soon(process_pending_frame)
+    pending_frame = (frame, budget)
+
+
+# called on every frame change, frame_duration is given by scene fps
+def run_live_file(frame, frame_duration, playing):
+    global frame_debt
+    if not has_live_file():
+        return
+
+    if live_file_on_frame is None:
+        # the file is compiled only when it changed
+        exec_hy_file(live_file_path)
+        return
+
+    budget = frame_budget if frame_budget is not None else frame_duration
+    if playing and frame_policy == "coalesce":
+        schedule_frame(frame, budget)
+    elif playing and frame_policy == "skip" and frame_debt > 0:
+        live_file_stats["skipped_frames"] += 1
+        frame_debt = max(0.0, frame_debt - budget)
+    else:
+        call_on_frame(frame, budget)
+
+
+def update_live_file_import_graph():
+    global live_file_import_graph
+    try:
+        live_file_import_graph = hydeps.build_import_graph(live_file_path, live_file_roots)
+    except Exception:
+        logger.exception("Failed to scan imports of live file", stack_info=True)
+        live_file_import_graph = {}
+    watched_files = hydeps.get_watched_files(live_file_import_graph)
+    watched_files.add(os.path.abspath(live_file_path))
+    live_file_watcher.set_files(watched_files)
+    logger.debug("watching {} file(s) via {}: {}".format(len(watched_files), live_file_watcher.backend_name,
+                                                         sorted(watched_files)))
+
+
+def reload_live_file():
+    if os.path.exists(live_file_path):
+        update_live_file_on_frame(run_hylang_file(live_file_path))
+    update_live_file_import_graph()
+
+
+def handle_live_file_changes(changed_paths):
+    logger.debug("detected changes in {}".format(sorted(changed_paths)))
+    try:
+        hydeps.reload_modules(hydeps.compute_reload_order(live_file_import_graph, changed_paths))
+    except Exception:
+        backtrace.present_hy_exception(*sys.exc_info())
+    reload_live_file()
+
+
+def start_live_file_watcher():
+    global live_file_watcher
+    live_file_watcher = watcher.FileWatcher(handle_live_file_changes)
+    reload_live_file()
+
+
+def stop_live_file_watcher():
+    global live_file_watcher
+    if live_file_watcher is not None:
+        live_file_watcher.close()
+        live_file_watcher = None
 
 
+# called on every pump tick, with inotify backend the watcher is driven by main loop and polling is a no-op
 def check_live_file():
     if has_live_file():
-        global live_file_last_mtime
-        if os.path.exists(live_file_path):
-            stat = os.stat(live_file_path)
-            if stat.st_mtime > live_file_last_mtime:
-                live_file_last_mtime = stat.st_mtime
-                run_hylang_file(live_file_path)
+        if live_file_watcher is None:
+            start_live_file_watcher()
+        else:
+            live_file_watcher.poll()
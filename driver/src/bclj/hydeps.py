@@ -0,0 +1,140 @@
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+
+from hy.lex import hy_parse, mangle
+from hy.models import HyExpression, HyList, HySymbol
+
+logger = logging.getLogger(__name__)
+
+
+# a node in the import graph of the live file
+class Dependency(object):
+
+    def __init__(self, name, path, imports):
+        self.name = name
+        self.path = path
+        self.imports = imports
+
+
+def collect_import_names(form, names):
+    if isinstance(form, HyExpression) and len(form) > 0:
+        head = form[0]
+        if isinstance(head, HySymbol) and str(head) in ("import", "require"):
+            for spec in form[1:]:
+                if isinstance(spec, HySymbol):
+                    names.append(mangle(spec))
+                elif isinstance(spec, HyList) and len(spec) > 0 and isinstance(spec[0], HySymbol):
+                    names.append(mangle(spec[0]))
+    if isinstance(form, (list, tuple)):
+        for child in form:
+            collect_import_names(child, names)
+
+
+def find_imported_module_names(path):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    names = []
+    collect_import_names(hy_parse(source, filename=path), names)
+    return names
+
+
+def is_under_roots(path, roots):
+    return any(path.startswith(root + os.sep) for root in roots)
+
+
+def resolve_module_path(name, roots):
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError, AttributeError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    path = os.path.abspath(spec.origin)
+    if not is_under_roots(path, roots):
+        return None
+    return path
+
+
+def scan_imports(path, roots):
+    if not path.endswith(".hy"):
+        # we don't parse python sources, changes to them are still tracked
+        return {}
+    imports = {}
+    try:
+        names = find_imported_module_names(path)
+    except Exception as e:
+        logger.debug("unable to scan imports of '{}': {}".format(path, e))
+        return imports
+    for name in names:
+        module_path = resolve_module_path(name, roots)
+        if module_path is not None:
+            imports[name] = module_path
+    return imports
+
+
+# returns {module-name: Dependency} for all user modules (under roots) transitively imported from entry file,
+# entry file itself is stored under None key
+def build_import_graph(entry_path, roots):
+    roots = [os.path.abspath(root) for root in roots]
+    graph = {}
+    queue = [(None, os.path.abspath(entry_path))]
+    while queue:
+        name, path = queue.pop()
+        if name in graph:
+            continue
+        imports = scan_imports(path, roots)
+        graph[name] = Dependency(name, path, set(imports))
+        for import_name, import_path in imports.items():
+            if import_name not in graph:
+                queue.append((import_name, import_path))
+    return graph
+
+
+def get_watched_files(graph):
+    return {dep.path for dep in graph.values()}
+
+
+# modules which changed plus modules which (transitively) import them,
+# ordered so that dependencies get reloaded before modules depending on them
+def compute_reload_order(graph, changed_paths):
+    dirty = {name for name, dep in graph.items() if name is not None and dep.path in changed_paths}
+    dependents = {}
+    for name, dep in graph.items():
+        for import_name in dep.imports:
+            dependents.setdefault(import_name, set()).add(name)
+    queue = list(dirty)
+    while queue:
+        for dependent in dependents.get(queue.pop(), ()):
+            if dependent is not None and dependent not in dirty:
+                dirty.add(dependent)
+                queue.append(dependent)
+
+    order = []
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        visited.add(name)
+        for import_name in graph[name].imports:
+            if import_name in graph:
+                visit(import_name)
+        if name in dirty:
+            order.append(name)
+
+    for name in sorted(dirty):
+        visit(name)
+    return order
+
+
+def reload_modules(names):
+    for name in names:
+        module = sys.modules.get(name)
+        if module is None:
+            # not imported yet, it will be picked up fresh
+            continue
+        logger.info("Reloading module '{}'".format(name))
+        importlib.reload(module)
@@ -1,7 +1,10 @@
+import gc
 import os
 import sys
+import asyncio
 import logging
-from bclj import log, v8, thug, blender
+from bclj import log, v8, thug, blender, http, worker, script_cache, ws, arrays, stats, console, bulk, handles, batch, \
+    transaction
 import mathutils
 import inspect
 
@@ -25,31 +28,18 @@ if entry_script is None:
 
 logger = logging.getLogger(__name__)
 
-previous_root = None
+# we keep a pre-built root ready to be swapped in on page reload
+standby_enabled = os.environ.get("BCLJ_JS_NO_STANDBY") is None
+standby_delay = 1
+
 current_root = None
+standby_root = None
 
 
 def report_eval_error(e):
     logger.error(e.stack)
 
 
-def read_script(path):
-    with open(path, encoding='utf-8') as f:
-        return f.read()
-
-
-def indent_args(args):
-    new_args = []
-    for arg in args:
-        if isinstance(arg, str):
-            new_arg = arg.replace("\n", "\n            ")
-            new_args.append(new_arg)
-        else:
-            new_args.append(arg)
-
-    return new_args
-
-
 def process_args_for_test_printing(args, style='out'):
     new_args = []
     for arg in args:
@@ -65,19 +55,20 @@ def process_args_for_test_printing(args, style='out'):
     return new_args
 
 
+# output is buffered and rate limited, see console.py
 class Console(v8.JSClass):
 
     @staticmethod
     def log(*args):
-        print(log.colorize_info("console.log"), *indent_args(args))
+        console.add("log", args)
 
     @staticmethod
     def warn(*args):
-        print(log.colorize_warning("console.wrn"), *indent_args(args))
+        console.add("warn", args)
 
     @staticmethod
     def error(*args):
-        print(log.colorize_error("console.err"), *indent_args(args))
+        console.add("error", args)
 
 
 class BCLJ(v8.JSClass):
@@ -91,15 +82,53 @@ class BCLJ(v8.JSClass):
         print(*process_args_for_test_printing(args, style='err'), end='')
 
     @staticmethod
+    @stats.timed("bclj.pycall")
     def pycall(f, pos_args, map_args):
+        # pos_args can be null when there are no positional args, see bcljs.compiler/gen-pos-args
         if map_args is not None:
-            return f(*pos_args, **map_args)
+            if pos_args is not None:
+                return f(*pos_args, **map_args)
+            else:
+                return f(**map_args)
         else:
             if pos_args is not None and len(pos_args) > 0:
                 return f(*pos_args)
             else:
                 return f()
 
+    @staticmethod
+    def bind(path):
+        return handles.bind(path)
+
+    @staticmethod
+    @stats.timed("bclj.pycall_batch")
+    def pycall_batch(calls, on_error=None):
+        return batch.run_batch(calls, on_error)
+
+    @staticmethod
+    def foreach_get_packed(collection, attr, type_code="f"):
+        return arrays.foreach_get_packed(collection, attr, type_code)
+
+    @staticmethod
+    def foreach_set_packed(collection, attr, type_code, data):
+        arrays.foreach_set_packed(collection, attr, type_code, data)
+
+    @staticmethod
+    def create_objects_packed(mesh, count, locations, rotations, scales, name, collection, linked):
+        return bulk.create_objects_packed(mesh, count, locations, rotations, scales, name, collection, linked)
+
+    @staticmethod
+    def create_vertex_instances_packed(source, locations, name):
+        return bulk.create_vertex_instances_packed(source, locations, name)
+
+    @staticmethod
+    def remove_objects(objects):
+        bulk.remove_objects(objects)
+
+    @staticmethod
+    def transaction(f, undo_message=None):
+        return transaction.run(f, undo_message)
+
     @staticmethod
     def repr(o):
         return repr(o)
@@ -112,6 +141,42 @@ class BCLJ(v8.JSClass):
     def mro(o):
         return o.__mro__
 
+    @staticmethod
+    def http_connection_stats():
+        return http.get_connection_stats()
+
+    @staticmethod
+    def pump_stats():
+        return worker.get_pump_stats()
+
+    @staticmethod
+    def script_cache_stats():
+        return script_cache.get_stats()
+
+    @staticmethod
+    def ws_stats():
+        return ws.get_ws_stats()
+
+    @staticmethod
+    def console_entries_json(n=None, level=None):
+        return console.get_recent_entries_json(n, level)
+
+    @staticmethod
+    def stats_json():
+        return stats.snapshot_json()
+
+    @staticmethod
+    def stats_enable(flag=True):
+        stats.enable(flag)
+
+    @staticmethod
+    def stats_reset():
+        stats.reset()
+
+    @staticmethod
+    def stats_dump(path=None):
+        return stats.dump(path)
+
     @staticmethod
     def system_exit(code):
         blender.kill(code)
@@ -124,11 +189,12 @@ class Test(v8.JSClass):
         return [1, 2, 3]
 
 
+@stats.timed("js.import_scripts")
 def import_scripts(path):
     full_path = os.path.join(compiled_assets_path, path)
-    logger.debug("request to import '{}'".format(log.colorize_file(full_path)))
-    code = read_script(full_path)
-    js_eval(code, path)
+    logger.debug(log.fmt("request to import '{}'", log.colorize_file(full_path)))
+    code = script_cache.get_script(full_path, wrap_code)
+    eval_wrapped_code(code, path)
 
 
 def create_root():
@@ -153,26 +219,72 @@ def wrap_code(js):
     return "try{" + js + "} catch (e) { reportEvalError(e) }"
 
 
-def js_eval(js, name=""):
-    with current_root.context as ctxt:
+@stats.timed("js.eval")
+def eval_wrapped_code(code, name="", root=None):
+    with (root if root is not None else current_root).context as ctxt:
         try:
-            code = wrap_code(js)
             return ctxt.eval(code, name)
         except Exception as e:
             logger.error(e)
 
 
+def js_eval(js, name="", root=None):
+    return eval_wrapped_code(wrap_code(js), name, root)
+
+
+# everything up to the entry script, this does not depend on compiled assets
+def prepare_root():
+    root = create_root()
+    js_eval("this.console = foreignConsole", root=root)
+    js_eval(arrays.js_prelude, root=root)
+    js_eval(bulk.js_prelude, root=root)
+    js_eval(stats.js_prelude, root=root)
+    js_eval(console.js_prelude, root=root)
+    js_eval(http.js_prelude, root=root)
+    js_eval(batch.js_prelude, root=root)
+    js_eval("window.location.origin = \"{}\"".format(origin_dir), root=root)
+    return root
+
+
+def prepare_standby_root():
+    global standby_root
+    if standby_root is None:
+        logger.debug("preparing standby js root")
+        standby_root = prepare_root()
+
+
+def schedule_standby_root_preparation():
+    if standby_enabled:
+        asyncio.get_event_loop().call_later(standby_delay, prepare_standby_root)
+
+
+def take_standby_root():
+    global standby_root
+    root = standby_root
+    standby_root = None
+    return root
+
+
+def destroy_root(root):
+    root._teardown()
+    gc.collect()
+    # let V8 reclaim the old context
+    v8.release_memory()
+
+
 def bootstrap():
     global current_root
-    current_root = create_root()
-    js_eval("this.console = foreignConsole")
-    js_eval("window.location.origin = \"{}\"".format(origin_dir))
+    current_root = take_standby_root() or prepare_root()
     js_eval('importScripts("{}")'.format(entry_script))
+    schedule_standby_root_preparation()
 
 
 def reload_page():
     print(log.colorize_js("===== page reload ====="))
     global current_root
-    global previous_root
     previous_root = current_root
+    current_root = None
+    if previous_root is not None:
+        destroy_root(previous_root)
+    handles.clear()
     bootstrap()
@@ -1,8 +1,11 @@
-import copy
 import os
 import re
 import sys
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
 import colorama
 
 colorize_output = True
@@ -55,6 +58,43 @@ def massage_log_name(name):
     return re.sub('^bclj.', "~", name)
 
 
+def abbreviate(msg, limit=300):
+    if len(msg) > limit:
+        return msg[:limit] + "...}"
+    else:
+        return msg
+
+
+# -- lazy formatting --------------------------------------------------------------------------------------------------------
+#
+# hot paths should not pay for formatting of messages which get filtered out, use:
+#
+#   logger.debug(log.fmt("ws#{} got message\n<< {}", self.id, log.abbreviated(msg)))
+#
+# the message is formatted only when a handler actually emits the record
+
+class fmt(object):
+    __slots__ = ("template", "args")
+
+    def __init__(self, template, *args):
+        self.template = template
+        self.args = args
+
+    def __str__(self):
+        return self.template.format(*self.args)
+
+
+class abbreviated(object):
+    __slots__ = ("msg", "limit")
+
+    def __init__(self, msg, limit=300):
+        self.msg = msg
+        self.limit = limit
+
+    def __str__(self):
+        return abbreviate(str(self.msg), self.limit)
+
+
 colorize_error = colorize_red
 colorize_info = colorize_blue
 colorize_warning = colorize_yellow
@@ -91,12 +131,110 @@ class LogFormatter(logging.Formatter):
         elif record.levelno >= logging.INFO:
             return colorize_info(message)
         else:
-            rich_record = copy.copy(record)
-            rich_record.shortlevelname = rich_record.levelname[0]
-            rich_record.shortname = massage_log_name(rich_record.name)
-            return colorize_gray(logging.Formatter.format(self, rich_record))
+            # note: we format directly instead of copying the record and going through logging.Formatter.format
+            return colorize_gray(self._fmt.format(threadName=record.threadName,
+                                                  shortname=massage_log_name(record.name),
+                                                  message=message))
+
+
+class JSONLinesFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {"time": record.created,
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "thread": record.threadName,
+                 "message": record.getMessage()}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+# formats lazy messages in the calling thread (their args may change later), but leaves the colorizing and actual writing
+# to the listener thread, so Blender's main thread never blocks on stdout
+class LogQueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # traceback keeps frames alive, we don't want to pass it to another thread
+            record.exc_info = None
+        return record
+
+
+# plain output (e.g. js console lines, see bclj.console) goes through the same queue as log records,
+# so both get written out in the order they were emitted
+class Output(object):
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def write_text(text):
+    sys.stdout.write(str(text) + "\n")
+    sys.stdout.flush()
+
+
+class LogQueueListener(logging.handlers.QueueListener):
+
+    def handle(self, record):
+        if isinstance(record, Output):
+            try:
+                write_text(record.text)
+            except Exception:
+                pass
+        else:
+            super().handle(record)
+
+
+listener = None
+log_queue = None
+
+
+# text can be any object, it gets converted to string on the listener thread
+def write(text):
+    if listener is not None:
+        log_queue.put(Output(text))
+    else:
+        write_text(text)
 
 
+# blocks until all queued records and output were written out, records logged later are dropped
+def shutdown():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def create_handlers():
+    handlers = []
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(LogFormatter())
+    handlers.append(handler)
+
+    jsonl_path = os.environ.get("BCLJ_LOG_JSONL")
+    if jsonl_path is not None:
+        jsonl_handler = logging.FileHandler(jsonl_path, encoding="utf-8")
+        jsonl_handler.setLevel(logging.DEBUG)
+        jsonl_handler.setFormatter(JSONLinesFormatter())
+        handlers.append(jsonl_handler)
+
+    return handlers
+
+
+# env config:
+#   BCLJ_DEBUG                    log debug messages from bclj loggers
+#   BCLJ_NO_COLOR                 do not colorize output
+#   BCLJ_LOG_SYNC                 write log records synchronously from the logging thread (useful when debugging crashes)
+#   BCLJ_LOG_JSONL                path to a file where all records get written as json lines
 def init():
     global colorize_output
     is_tty = sys.stdout.isatty()
@@ -111,7 +249,16 @@ def init():
         logger.setLevel(logging.DEBUG)
 
     root_logger = logging.getLogger()
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    handler.setFormatter(LogFormatter())
-    root_logger.addHandler(handler)
+    handlers = create_handlers()
+    if os.environ.get("BCLJ_LOG_SYNC") is not None:
+        for handler in handlers:
+            root_logger.addHandler(handler)
+        return
+
+    global listener, log_queue
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(LogQueueHandler(log_queue))
+    listener = LogQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # note: QueueListener thread is a daemon, without stopping it pending records would get lost at exit
+    atexit.register(shutdown)
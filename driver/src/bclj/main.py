@@ -1,6 +1,6 @@
 import logging
 import asyncio
-from bclj import env_info, js, hy, blender, autils
+from bclj import env_info, hy, blender, autils, stats, startup
 
 logger = logging.getLogger(__name__)
 main_event_loop = None
@@ -11,18 +11,29 @@ def print_welcome():
 
 
 async def bootstrap_js():
-    # give all other system some time before we boot js engine
-    await asyncio.sleep(1)
-    js.bootstrap()
+    # wait for the first pump of the event loop and for heavy imports done in background
+    with startup.phase("waiting for readiness"):
+        await startup.wait_ready("pump", "warmup")
+    with startup.phase("js import"):
+        # js module pulls heavy dependencies, we import it lazily
+        from bclj import js
+    with startup.phase("js bootstrap"):
+        js.bootstrap()
+    startup.report()
 
 
 def start():
     global main_event_loop
 
-    print_welcome()
-    hy.start_hyrepl()
-    blender.register()
-
     main_event_loop = asyncio.get_event_loop()
     assert (main_event_loop is not None)
+    startup.start_warmup()
+
+    with startup.phase("welcome"):
+        print_welcome()
+    with startup.phase("hyrepl"):
+        hy.start_hyrepl()
+    with startup.phase("blender register"):
+        blender.register()
+    stats.start_periodic_dump_if_needed(main_event_loop)
     autils.call_soon(main_event_loop, bootstrap_js)
@@ -1,8 +1,12 @@
 import os
 import sys
 
+from bclj import log, console
+
 
 def brutal_exit(code):
+    console.shutdown()
+    log.shutdown()
     sys.stdout.flush()
     sys.stderr.flush()
     os._exit(code)
@@ -0,0 +1,121 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+
+from bclj import stats
+
+logger = logging.getLogger(__name__)
+
+# we keep prepared (decoded and wrapped) sources of scripts imported via importScripts
+# to skip reading and decoding unchanged files on page reloads,
+# passing the identical source string back to V8 also lets it hit its own per-isolate compilation cache
+max_cache_size = int(os.environ.get("BCLJ_SCRIPT_CACHE_MB", "256")) * 1024 * 1024
+
+cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "revalidations": 0,
+    "evictions": 0,
+    "entries": 0,
+    "size": 0,
+}
+
+
+class CacheEntry(object):
+    __slots__ = ("stamp", "digest", "code", "size")
+
+    def __init__(self, stamp, digest, code, size):
+        self.stamp = stamp
+        self.digest = digest
+        self.code = code
+        self.size = size
+
+
+# path -> CacheEntry, in least recently used order
+cache_entries = OrderedDict()
+
+# path -> (stamp, bytes) read ahead of time by startup warmup thread
+prefetched_scripts = {}
+
+
+def read_script_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def compute_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def get_file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def evict_if_needed():
+    while cache_stats["size"] > max_cache_size and len(cache_entries) > 1:
+        path, entry = cache_entries.popitem(last=False)
+        cache_stats["size"] -= entry.size
+        cache_stats["evictions"] += 1
+        logger.debug("evicted '{}' from script cache".format(path))
+    cache_stats["entries"] = len(cache_entries)
+
+
+def store_entry(path, entry):
+    old_entry = cache_entries.pop(path, None)
+    if old_entry is not None:
+        cache_stats["size"] -= old_entry.size
+    cache_entries[path] = entry
+    cache_stats["size"] += entry.size
+    evict_if_needed()
+
+
+# prepare is called with decoded source and its result is what we cache and return
+def get_script(path, prepare):
+    stamp = get_file_stamp(path)
+    entry = cache_entries.get(path)
+    if entry is not None and entry.stamp == stamp:
+        cache_stats["hits"] += 1
+        cache_entries.move_to_end(path)
+        return entry.code
+
+    prefetched = prefetched_scripts.pop(path, None)
+    if prefetched is not None and prefetched[0] == stamp:
+        data = prefetched[1]
+    else:
+        data = read_script_bytes(path)
+    digest = compute_digest(data)
+    if entry is not None and entry.digest == digest:
+        # file was touched but its content is the same (e.g. rewritten by compiler)
+        cache_stats["revalidations"] += 1
+        entry.stamp = stamp
+        cache_entries.move_to_end(path)
+        return entry.code
+
+    cache_stats["misses"] += 1
+    code = prepare(data.decode("utf-8"))
+    store_entry(path, CacheEntry(stamp, digest, code, len(data)))
+    return code
+
+
+# can be called from a background thread
+def prefetch(path):
+    try:
+        stamp = get_file_stamp(path)
+        prefetched_scripts[path] = (stamp, read_script_bytes(path))
+    except OSError as e:
+        logger.debug("unable to prefetch '{}': {}".format(path, e))
+
+
+def get_stats():
+    return dict(cache_stats)
+
+
+stats.register_provider("script_cache", get_stats)
+
+
+def clear():
+    cache_entries.clear()
+    cache_stats["entries"] = 0
+    cache_stats["size"] = 0
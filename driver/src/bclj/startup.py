@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+started_at = time.perf_counter()
+
+# modules which are needed only by js runtime, we import them in background while Blender finishes its startup
+heavy_modules = ["six", "aiohttp", "websockets"]
+if os.environ.get("BCLJ_DOM_BACKEND") == "bs4":
+    heavy_modules += ["bs4", "lxml.html"]
+
+phases = []
+
+ready_events = {}
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+
+def record_phase(name, duration):
+    phases.append((name, duration))
+
+
+# -- readiness --------------------------------------------------------------------------------------------------------------
+
+# must be called from main thread
+def get_ready_event(name):
+    event = ready_events.get(name)
+    if event is None:
+        event = ready_events[name] = asyncio.Event()
+    return event
+
+
+def signal_ready(name):
+    logger.debug("startup: '{}' is ready after {:.3f}s".format(name, time.perf_counter() - started_at))
+    get_ready_event(name).set()
+
+
+def signal_ready_threadsafe(loop, name):
+    loop.call_soon_threadsafe(signal_ready, name)
+
+
+async def wait_ready(*names):
+    for name in names:
+        await get_ready_event(name).wait()
+
+
+# -- warmup -----------------------------------------------------------------------------------------------------------------
+
+def get_entry_script_path():
+    parts = [os.environ.get(name) for name in ("BCLJ_JS_ORIGIN_DIR", "BCLJ_JS_ASSETS_DIR", "BCLJ_JS_ENTRY_SCRIPT")]
+    if None in parts:
+        return None
+    return os.path.join(*parts)
+
+
+def warmup(loop):
+    start = time.perf_counter()
+    try:
+        for name in heavy_modules:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.debug("startup: unable to pre-import '{}': {}".format(name, e))
+        entry_script_path = get_entry_script_path()
+        if entry_script_path is not None:
+            from bclj import script_cache
+            script_cache.prefetch(entry_script_path)
+    finally:
+        # list.append is atomic, main thread reads phases only after warmup signalled readiness
+        record_phase("warmup (background)", time.perf_counter() - start)
+        signal_ready_threadsafe(loop, "warmup")
+
+
+def start_warmup():
+    loop = asyncio.get_event_loop()
+    t = threading.Thread(target=warmup, args=(loop,))
+    t.name = "{} [warmup]".format(__name__)
+    t.daemon = True
+    t.start()
+
+
+# -- reporting --------------------------------------------------------------------------------------------------------------
+
+def report():
+    total = time.perf_counter() - started_at
+    lines = ["  {:<32} {:>9.1f}ms".format(name, duration * 1000) for name, duration in phases]
+    lines.append("  {:<32} {:>9.1f}ms".format("total since driver import", total * 1000))
+    logger.debug("startup timing:\n" + "\n".join(lines))
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# timing instrumentation of the js <-> python bridge
+#
+# collection can be switched at runtime via enable()/disable(), from js via bclj.stats_enable(true/false),
+# when disabled, instrumented functions pay just one global flag check
+#
+# env config:
+#   BCLJ_STATS                    enable collection from startup
+#   BCLJ_STATS_DUMP               path to a json file where stats get periodically dumped
+#   BCLJ_STATS_DUMP_INTERVAL      dump period in seconds (default 10)
+
+enabled = os.environ.get("BCLJ_STATS") is not None
+
+dump_path = os.environ.get("BCLJ_STATS_DUMP")
+dump_interval = float(os.environ.get("BCLJ_STATS_DUMP_INTERVAL", "10"))
+
+# histogram buckets are powers of two in microseconds
+histogram_size = 32
+
+
+class Timing(object):
+    __slots__ = ("count", "total", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * histogram_size
+
+    def record(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        bucket = min(int(duration * 1000000).bit_length(), histogram_size - 1)
+        self.histogram[bucket] += 1
+
+    # returns upper bound of the bucket containing given percentile (in seconds)
+    def percentile(self, p):
+        threshold = p * self.count
+        cumulative = 0
+        for bucket, n in enumerate(self.histogram):
+            cumulative += n
+            if n and cumulative >= threshold:
+                return min((1 << bucket) / 1000000, self.max)
+        return self.max
+
+    def describe(self):
+        return {"count": self.count,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else 0.0,
+                "max": self.max,
+                "p50": self.percentile(0.50),
+                "p90": self.percentile(0.90),
+                "p99": self.percentile(0.99)}
+
+
+timings = {}
+
+
+def record(name, duration):
+    timing = timings.get(name)
+    if timing is None:
+        timing = timings[name] = Timing()
+    timing.record(duration)
+
+
+def timed(name):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+# -- API --------------------------------------------------------------------------------------------------------------------
+
+def enable(flag=True):
+    global enabled
+    enabled = bool(flag)
+
+
+def disable():
+    enable(False)
+
+
+def is_enabled():
+    return enabled
+
+
+def reset():
+    timings.clear()
+
+
+# extra stats from other subsystems, name -> fn returning a dict
+providers = {}
+
+
+def register_provider(name, f):
+    providers[name] = f
+
+
+def snapshot():
+    result = {"enabled": enabled,
+              "timings": {name: timing.describe() for name, timing in sorted(timings.items())}}
+    for name, f in providers.items():
+        try:
+            result[name] = f()
+        except Exception as e:
+            result[name] = {"error": str(e)}
+    return result
+
+
+def snapshot_json():
+    return json.dumps(snapshot())
+
+
+def dump(path=None):
+    path = path or dump_path
+    assert path, "no stats dump path given and BCLJ_STATS_DUMP env variable is not set"
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def periodic_dump(path, interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            dump(path)
+        except Exception:
+            logger.exception("Failed to dump stats to '{}'".format(path))
+
+
+def start_periodic_dump_if_needed(loop):
+    if dump_path:
+        logger.info("Dumping stats to '{}' every {}s".format(dump_path, dump_interval))
+        loop.create_task(periodic_dump(dump_path, dump_interval))
+
+
+js_prelude = """
+(function(bclj) {
+  bclj.stats = function() {
+    return JSON.parse(bclj.stats_json());
+  };
+})(bclj);
+"""
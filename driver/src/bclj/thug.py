@@ -8,20 +8,17 @@
 import inspect
 import os
 import random
-import time
+import weakref
 
 import sys
-import bs4
 import six
 from six import StringIO
 import six.moves.urllib.parse as urlparse
-from lxml.html import builder as E
-from lxml.html import tostring
-import sched
 
-sched = sched.scheduler(time.time, time.sleep)
+from bclj import ws, http, v8, timers, dom
 
-from bclj import ws, http, v8
+if dom.backend_name == "bs4":
+    from bclj import dom_bs4 as dom
 
 JSClass = v8.JSClass
 
@@ -124,73 +121,19 @@ class Location(JSClass):
 
 
 class Window(JSClass):
-    class Timer(object):
-        max_loops = 3
-
-        def __init__(self, window, code, delay, repeat, lang='JavaScript'):
-            self.window = window
-            self.code = code
-            self.delay = float(delay) / 1000
-            self.repeat = repeat
-            self.lang = lang
-            self.running = True
-            self.loops = self.__init_loops()
-
-        def __init_loops(self):
-            max_loops = self.max_loops - 1
-
-            if not self.delay:
-                return max_loops
-
-            loops = int(0.1 * 600 / self.delay)
-            return min(loops, max_loops)
-
-        def start(self):
-            self.event = sched.enter(self.delay, 1, self.execute, ())
-
-            try:
-                sched.run()
-            except Exception as e:  # pragma: no cover
-                print("[Timer] Scheduler error: %s", str(e))
-
-        def stop(self):
-            self.running = False
-
-            if self.event in sched.queue:  # pragma: no cover
-                sched.cancel(self.event)
-
-        def execute(self):
-            if not self.running:
-                return None
-
-            with self.window.context as ctx:
-                try:
-                    if isinstance(self.code, v8.JSFunction):
-                        self.code()
-                    else:
-                        ctx.eval(self.code)
-                except Exception as e:  # pragma: no cover
-                    print("Error while handling timer callback", e)
-
-                    return None
-
-            if self.repeat and self.loops > 0:
-                self.loops -= 1
-                self.event = sched.enter(self.delay, 1, self.execute, ())
 
     def __init__(self, url, navigator=None, personality='winxpie60', name="",
                  target='_blank', parent=None, opener=None, replace=False, screen=None,
                  width=800, height=600, left=0, top=None, **kwds):
         self.url = url
-        self.doc = Document(bs4.BeautifulSoup('', 'lxml'))
+        self.doc = Document(dom.create_document())
         self.document = self.doc
         self.context = v8.JSContext(self)
 
-        self.WebSocket = WebSocket
-        self.WebSocket.window = self
-
-        self.XMLHttpRequest = XMLHttpRequest
-        self.XMLHttpRequest.window = self
+        # each window gets its own classes, so that instances get bound to the window which created them
+        self.WebSocket = type("WebSocket", (WebSocket,), {"window": self})
+        self.XMLHttpRequest = type("XMLHttpRequest", (XMLHttpRequest,), {"window": self})
+        self._websockets = weakref.WeakSet()
 
         self.doc.window = self
         self.doc.contentWindow = self
@@ -224,7 +167,7 @@ class Window(JSClass):
         self.innerHeight = height
         self.outerWidth = width
         self.outerHeight = height
-        self.timers = []
+        self._timers = timers.Timers(self)
         # self.java          = java()
 
         self._symbols = set()
@@ -233,6 +176,20 @@ class Window(JSClass):
     # TODO: implement this?
     addEventListener = add_event_listener
 
+    # we have to break reference cycles between the window and its JSContext by hand,
+    # otherwise the old context would never get released
+    def _teardown(self):
+        self._closed = True
+        self._timers.cancel_all()
+        for websocket in list(self._websockets):
+            websocket.shutdown()
+        self._websockets.clear()
+        self.WebSocket.window = None
+        self.XMLHttpRequest.window = None
+        self.doc.window = None
+        self.doc.contentWindow = None
+        self.context = None
+
     def getLocation(self):
         """the Location object for the window"""
         return self._location
@@ -242,7 +199,7 @@ class Window(JSClass):
 
     location = property(getLocation, setLocation)
 
-    def setTimeout(self, f, delay=0, lang='JavaScript'):
+    def setTimeout(self, f, delay=0, *args):
         """
         Sets a delay for executing a function.
         Syntax
@@ -259,13 +216,9 @@ class Window(JSClass):
 
         ID is the interval ID.
         """
-        timer = Window.Timer(self, f, delay, False, lang)
-        self.timers.append(timer)
-        timer.start()
-
-        return len(self.timers) - 1
+        return self._timers.set_timeout(f, delay, args)
 
-    def clearTimeout(self, timeoutID):
+    def clearTimeout(self, timeoutID=None):
         """
         Clears the delay set by window.setTimeout().
         Syntax
@@ -276,25 +229,166 @@ class Window(JSClass):
 
         timeoutID is the ID of the timeout you wish you clear.
         """
-        if timeoutID < len(self.timers):
-            self.timers[timeoutID].stop()
+        self._timers.clear(timeoutID)
+
+    def setInterval(self, f, delay=0, *args):
+        """
+        Calls a function repeatedly, with a fixed time delay between each call to that function.
+        Syntax
+
+        ID = window.setInterval("funcName", delay)
+        """
+        return self._timers.set_interval(f, delay, args)
+
+    def clearInterval(self, intervalID=None):
+        """
+        Cancels repeated action which was set up using setInterval().
+        Syntax
+
+        window.clearInterval(intervalID)
+        """
+        self._timers.clear(intervalID)
+
+    def requestAnimationFrame(self, callback):
+        """
+        Calls the callback before the next repaint of Blender's 3D viewport.
+        Syntax
+
+        ID = window.requestAnimationFrame(callback)
+        """
+        return self._timers.request_animation_frame(callback)
+
+    def cancelAnimationFrame(self, requestID=None):
+        self._timers.cancel_animation_frame(requestID)
 
 
 class EventTarget(object):
     pass
 
 
+# -- wrapper cache ----------------------------------------------------------------------------------------------------------
+#
+# wrappers are cached weakly on the underlying dom nodes, so repeated firstChild/nextSibling/parentNode accesses
+# return the same wrapper as long as anyone (e.g. js side) holds it, without keeping the wrapper alive on its own
+
+def get_cached_wrapper(obj):
+    ref = dom.get_wrapper_ref(obj)
+    return ref() if ref is not None else None
+
+
+def set_cached_wrapper(obj, wrapper):
+    dom.set_wrapper_ref(obj, weakref.ref(wrapper))
+
+
 def node_wrap(doc, obj):
     if obj is None:
         return None
 
+    wrapper = get_cached_wrapper(obj)
+    if wrapper is not None:
+        return wrapper
+
     # if isinstance(obj, bs4.CData): # pragma: no cover
     #     return CDATASection(doc, obj)
 
-    if isinstance(obj, bs4.NavigableString):
+    if isinstance(obj, dom.NavigableString):
         return Text(doc, obj)
 
-    return Element(doc, obj)
+    return DOMImplementation.createHTMLElement(doc, obj)
+
+
+# -- id/name index ----------------------------------------------------------------------------------------------------------
+#
+# each document keeps an index of its elements by id and name attributes, it gets updated when we modify the tree
+# via appendChild/innerHTML/insertAdjacentHTML or when id/name attributes are set through element wrappers,
+# lookups verify the hit, so changes made behind our back can make us fall back to a tree walk, never return garbage
+
+class ElementIndex(object):
+
+    def __init__(self, document):
+        self.document = document
+        self.by_id = {}
+        self.by_name = {}
+        self.add_tree(document)
+
+    @staticmethod
+    def _add(index, key, tag):
+        if key is not None and key not in index:
+            index[key] = tag
+
+    @staticmethod
+    def _remove(index, key, tag):
+        if key is not None and index.get(key) is tag:
+            del index[key]
+
+    def add_tag(self, tag):
+        self._add(self.by_id, tag.attrs.get("id"), tag)
+        self._add(self.by_name, tag.attrs.get("name"), tag)
+
+    def remove_tag(self, tag):
+        self._remove(self.by_id, tag.attrs.get("id"), tag)
+        self._remove(self.by_name, tag.attrs.get("name"), tag)
+
+    def add_tree(self, node):
+        if not isinstance(node, dom.Tag):
+            return
+        if node is not self.document:
+            self.add_tag(node)
+        for tag in node.find_all(True):
+            self.add_tag(tag)
+
+    def remove_tree(self, node):
+        if not isinstance(node, dom.Tag):
+            return
+        self.remove_tag(node)
+        for tag in node.find_all(True):
+            self.remove_tag(tag)
+
+    def _lookup(self, index, attr, key):
+        tag = index.get(key)
+        if tag is None:
+            return None
+        if tag.attrs.get(attr) == key and find_document(tag) is self.document:
+            return tag
+        # stale entry
+        del index[key]
+        tag = self.document.find(attrs={attr: key})
+        if tag is not None:
+            index[key] = tag
+        return tag
+
+    def get_by_id(self, element_id):
+        return self._lookup(self.by_id, "id", element_id)
+
+    def get_by_name(self, name):
+        return self._lookup(self.by_name, "name", name)
+
+
+def find_document(tag):
+    while tag.parent is not None:
+        tag = tag.parent
+    return tag if isinstance(tag, dom.Document) else None
+
+
+def get_element_index(document):
+    index = dom.get_index(document)
+    if index is None:
+        index = ElementIndex(document)
+        dom.set_index(document, index)
+    return index
+
+
+# returns index only for tags attached to a document
+def find_element_index(tag):
+    document = find_document(tag)
+    return get_element_index(document) if document is not None else None
+
+
+def index_inserted_nodes(target, nodes):
+    index = find_element_index(target)
+    if index is not None:
+        for node in nodes:
+            index.add_tree(node)
 
 
 class Node(JSClass, EventTarget):
@@ -335,6 +429,9 @@ class Node(JSClass, EventTarget):
     def parentNode(self):
         return Node.wrap(self.doc, self.tag.parent) if self.tag.parent else None
 
+    def hasChildNodes(self):
+        return len(self.tag.contents) > 0
+
     @property
     def innerText(self):
         return str(self.tag.string)
@@ -365,15 +462,8 @@ class Node(JSClass, EventTarget):
             raise DOMException(DOMException.HIERARCHY_REQUEST_ERR)
 
         # If the newChild is already in the tree, it is first removed
-        if getattr(newChild, 'tag', None) and newChild.tag in self.tag.contents:
-            newChildHash = hash(newChild.tag._node)
-
-            for p in self.tag.contents:
-                if getattr(p, '_node', None) is None:
-                    continue
-
-                if newChildHash == hash(p._node):
-                    p.extract()
+        if getattr(newChild, 'tag', None) is not None and newChild.tag.parent is self.tag:
+            newChild.tag.extract()
 
         if self.is_text(newChild):
             self.tag.append(newChild.data.output_ready(formatter=lambda x: x))
@@ -385,13 +475,17 @@ class Node(JSClass, EventTarget):
 
         if newChild.nodeType in (Node.DOCUMENT_FRAGMENT_NODE,):
             node = self.tag
+            appended = []
             for p in newChild.tag.find_all_next():
                 node.append(p)
+                appended.append(p)
                 node = p
 
+            index_inserted_nodes(self.tag, appended)
             return newChild
 
         self.tag.append(newChild.tag)
+        index_inserted_nodes(self.tag, [newChild.tag])
         return newChild
 
     @staticmethod
@@ -402,7 +496,7 @@ class Node(JSClass, EventTarget):
 class CharacterData(Node):
     def __init__(self, doc, tag):
         self.tag = tag
-        self.tag._node = self
+        set_cached_wrapper(tag, self)
         Node.__init__(self, doc)
 
     def getData(self):
@@ -527,7 +621,7 @@ class ElementCSSInlineStyle(object):
 class Element(Node, ElementCSSInlineStyle):
     def __init__(self, doc, tag):
         self.tag = tag
-        self.tag._node = self
+        set_cached_wrapper(tag, self)
         Node.__init__(self, doc)
         ElementCSSInlineStyle.__init__(self, doc, tag)
 
@@ -553,8 +647,31 @@ def attr_property(name, attrtype=str, readonly=False, default=None):
     return property(getter) if readonly else property(getter, setter)
 
 
+# bumped on every id/name change, HTMLCollection uses it to invalidate its named items
+indexed_attrs_version = 0
+
+
+# attributes tracked by ElementIndex
+def indexed_attr_property(name):
+    def getter(self):
+        return str(self.tag[name]) if self.tag.has_attr(name) else None
+
+    def setter(self, value):
+        global indexed_attrs_version
+        indexed_attrs_version += 1
+        index = find_element_index(self.tag)
+        if index is not None:
+            index.remove_tag(self.tag)
+        self.tag[name] = str(value)
+        if index is not None:
+            index.add_tag(self.tag)
+
+    return property(getter, setter)
+
+
 class HTMLElement(Element):
-    id = attr_property("id")
+    id = indexed_attr_property("id")
+    name = indexed_attr_property("name")
     title = attr_property("title")
     lang = attr_property("lang")
     dir = attr_property("dir")
@@ -575,14 +692,20 @@ class HTMLElement(Element):
         return html.getvalue()
 
     def setInnerHTML(self, html):
+        index = find_element_index(self.tag)
+        if index is not None:
+            for node in self.tag.contents:
+                index.remove_tree(node)
+
         self.tag.clear()
 
-        for node in bs4.BeautifulSoup(html, "html.parser").contents:
+        nodes = list(dom.parse_fragment(html))
+        for node in nodes:
             self.tag.append(node)
 
-            name = getattr(node, 'name', None)
-            if name is None:
-                continue
+        if index is not None:
+            for node in nodes:
+                index.add_tree(node)
 
     def getOuterHTML(self):
         return str(self.tag)
@@ -623,10 +746,13 @@ class HTMLElement(Element):
             target = self.tag.parent if self.tag.parent else self.doc.find('body')
             pos = target.index(self.tag) + 1
 
-        for node in bs4.BeautifulSoup(text, "html.parser").contents:
+        nodes = list(dom.parse_fragment(text))
+        for node in nodes:
             target.insert(pos, node)
             pos += 1
 
+        index_inserted_nodes(target, nodes)
+
 
 class Document(JSClass):
 
@@ -634,10 +760,10 @@ class Document(JSClass):
         Node.__init__(self, doc)
 
     def createElement(self, tagname, tagvalue=None):
-        return DOMImplementation.createHTMLElement(self, bs4.Tag(parser=self.doc, name=tagname))
+        return DOMImplementation.createHTMLElement(self, dom.create_element(self.doc, tagname))
 
     def getElementById(self, elementId):
-        tag = self.doc.find(id=elementId)
+        tag = get_element_index(self.doc).get_by_id(elementId)
         return DOMImplementation.createHTMLElement(self, tag) if tag else None
 
 
@@ -658,6 +784,8 @@ class HTMLCollection(JSClass):
     def __init__(self, doc, nodes):
         self.doc = doc
         self.nodes = nodes
+        self._named_items = None
+        self._named_items_version = None
 
     def __len__(self):
         return self.length
@@ -667,6 +795,7 @@ class HTMLCollection(JSClass):
 
     def __delitem__(self, key):  # pragma: no cover
         self.nodes.__delitem__(key)
+        self._named_items = None
 
     def __getattr__(self, key):
         return self.namedItem(key)
@@ -679,21 +808,33 @@ class HTMLCollection(JSClass):
         if index < 0 or index >= self.length:
             return None
 
-        if isinstance(self.nodes[index], bs4.element.Tag):
+        if isinstance(self.nodes[index], dom.Tag):
             return DOMImplementation.createHTMLElement(self.doc, self.nodes[index])
 
         return self.nodes[index]
 
-    def namedItem(self, name):
+    # ids take precedence over names, first match wins in both cases
+    def build_named_items(self):
+        by_id = {}
+        by_name = {}
         for node in self.nodes:
-            if 'id' in node.attrs and node.attrs['id'] in (name,):
-                return DOMImplementation.createHTMLElement(self.doc, node)
+            attrs = getattr(node, 'attrs', None)
+            if not attrs:
+                continue
+            if 'id' in attrs:
+                by_id.setdefault(attrs['id'], node)
+            if 'name' in attrs:
+                by_name.setdefault(attrs['name'], node)
+        by_name.update(by_id)
+        return by_name
 
-        for node in self.nodes:
-            if 'name' in node.attrs and node.attrs['name'] in (name,):
-                return DOMImplementation.createHTMLElement(self.doc, node)
+    def namedItem(self, name):
+        if self._named_items is None or self._named_items_version != indexed_attrs_version:
+            self._named_items = self.build_named_items()
+            self._named_items_version = indexed_attrs_version
 
-        return None
+        node = self._named_items.get(name)
+        return DOMImplementation.createHTMLElement(self.doc, node) if node is not None else None
 
 
 class HTMLDocument(Document):
@@ -798,6 +939,10 @@ class DOMImplementation(HTMLDocument):
 
     @staticmethod
     def createHTMLElement(doc, tag):
+        wrapper = get_cached_wrapper(tag)
+        if isinstance(wrapper, HTMLElement):
+            return wrapper
+
         # if isinstance(tag, bs4.NavigableString):
         #     return Node.wrap(doc, tag)
 
@@ -807,10 +952,4 @@ class DOMImplementation(HTMLDocument):
         return HTMLElement(doc, tag)
 
     def _createHTMLDocument(self, title=None):
-        body = E.BODY()
-        title = E.TITLE(title) if title else ""
-        head = E.HEAD(title)
-        html = E.HTML(head, body)
-
-        soup = bs4.BeautifulSoup(tostring(html, doctype='<!doctype html>'), "lxml")
-        return DOMImplementation(soup)
+        return DOMImplementation(dom.create_html_document(title))
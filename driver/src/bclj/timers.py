@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+
+import bpy
+
+from bclj import v8, transaction
+
+logger = logging.getLogger(__name__)
+
+# browsers clamp nested timers to 4ms, we do the same for intervals to prevent busy looping the main loop
+min_interval_delay = 0.004
+
+# when no 3D view can be redrawn (e.g. running in background mode) we emulate 60fps
+animation_frame_fallback_delay = 1 / 60
+# safety net for the case that tagged areas do not get redrawn (e.g. minimized window)
+animation_frame_redraw_timeout = 0.25
+
+# timers with pending animation frame requests, flushed on next redraw
+pending_animation_frames = set()
+
+time_origin = time.monotonic()
+
+
+def now_ms():
+    return (time.monotonic() - time_origin) * 1000
+
+
+def tag_redraw():
+    if transaction.defer_redraw():
+        return True
+    tagged = False
+    wm = getattr(bpy.context, "window_manager", None)
+    if wm is None:
+        return tagged
+    for window in wm.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+                tagged = True
+    return tagged
+
+
+# this is registered as SpaceView3D draw handler,
+# we don't want to run js inside drawing code so we just schedule the flush on main loop
+def on_redraw():
+    if pending_animation_frames:
+        loop = asyncio.get_event_loop()
+        for timers in list(pending_animation_frames):
+            loop.call_soon(timers.flush_animation_frames)
+
+
+def to_timer_id(timer_id):
+    try:
+        return int(timer_id)
+    except (TypeError, ValueError):
+        return None
+
+
+# implements window.setTimeout & co. on top of main asyncio loop
+# we let the loop keep the heap of scheduled callbacks, timer ids are never reused
+class Timers(object):
+
+    def __init__(self, window):
+        assert threading.current_thread() is threading.main_thread()
+        self._window = window
+        self._loop = asyncio.get_event_loop()
+        self._ids = itertools.count(1)
+        self._handles = {}
+        self._animation_frame_callbacks = {}
+        self._animation_frame_fallback = None
+
+    def _execute(self, code, args):
+        if isinstance(code, v8.JSFunction):
+            v8.execute_callback(self._window.context, code, *args)
+        else:
+            with self._window.context as ctx:
+                try:
+                    ctx.eval(str(code))
+                except Exception:
+                    logger.exception("Unhandled exception while evaluating timer code", stack_info=True)
+
+    def _fire_timeout(self, timer_id, code, args):
+        if self._handles.pop(timer_id, None) is not None:
+            self._execute(code, args)
+
+    def _fire_interval(self, timer_id, code, delay, args):
+        if timer_id not in self._handles:
+            return
+        # reschedule first, so the callback is able to clear its own interval
+        self._handles[timer_id] = self._loop.call_later(delay, self._fire_interval, timer_id, code, delay, args)
+        self._execute(code, args)
+
+    def set_timeout(self, code, delay, args):
+        timer_id = next(self._ids)
+        delay = max(0, float(delay or 0) / 1000)
+        self._handles[timer_id] = self._loop.call_later(delay, self._fire_timeout, timer_id, code, args)
+        return timer_id
+
+    def set_interval(self, code, delay, args):
+        timer_id = next(self._ids)
+        delay = max(min_interval_delay, float(delay or 0) / 1000)
+        self._handles[timer_id] = self._loop.call_later(delay, self._fire_interval, timer_id, code, delay, args)
+        return timer_id
+
+    def clear(self, timer_id):
+        handle = self._handles.pop(to_timer_id(timer_id), None)
+        if handle is not None:
+            handle.cancel()
+
+    def request_animation_frame(self, callback):
+        timer_id = next(self._ids)
+        self._animation_frame_callbacks[timer_id] = callback
+        if self not in pending_animation_frames:
+            pending_animation_frames.add(self)
+            delay = animation_frame_redraw_timeout if tag_redraw() else animation_frame_fallback_delay
+            self._animation_frame_fallback = self._loop.call_later(delay, self.flush_animation_frames)
+        return timer_id
+
+    def cancel_animation_frame(self, timer_id):
+        self._animation_frame_callbacks.pop(to_timer_id(timer_id), None)
+
+    def flush_animation_frames(self):
+        pending_animation_frames.discard(self)
+        if self._animation_frame_fallback is not None:
+            self._animation_frame_fallback.cancel()
+            self._animation_frame_fallback = None
+        # callbacks requested from within callbacks belong to the next frame
+        callbacks = self._animation_frame_callbacks
+        self._animation_frame_callbacks = {}
+        timestamp = now_ms()
+        for callback in callbacks.values():
+            self._execute(callback, (timestamp,))
+
+    def cancel_all(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
+        self._animation_frame_callbacks.clear()
+        pending_animation_frames.discard(self)
+        if self._animation_frame_fallback is not None:
+            self._animation_frame_fallback.cancel()
+            self._animation_frame_fallback = None
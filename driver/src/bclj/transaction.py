@@ -0,0 +1,143 @@
+import sys
+import logging
+from contextlib import contextmanager
+
+import bpy
+
+from bclj import stats
+
+logger = logging.getLogger(__name__)
+
+# transaction scope for bulk edits
+#
+# each bpy.ops call from python pushes an undo step and bpy.ops wrapper updates active view layer
+# (evaluates depsgraph) before and after the operator, building a scene with thousands of operator calls
+# evaluates depsgraph thousands of times
+#
+# inside a transaction:
+#   - global undo is disabled, so operators don't push undo steps
+#   - view layer updates done by bpy.ops wrapper are skipped
+#   - redraw tagging (see timers.tag_redraw) is deferred
+#
+# when the outermost transaction ends we do a single view layer update, tag 3D views for redraw and optionally push
+# one undo step
+#
+# note that operators which depend on evaluated data of objects created earlier in the same transaction
+# (e.g. modifiers applied to fresh objects) might see stale data, call update() explicitly when needed
+#
+# usage from js:
+#
+#   bclj.transaction(function() { ... }, "Build scene");
+#
+# usage from hy:
+#
+#   (import [bclj [transaction]])
+#   (with [(transaction.scope "Build scene")] ...)
+
+depth = 0
+
+saved_global_undo = None
+saved_view_layer_update = None
+
+transaction_stats = {
+    "transactions": 0,
+    "skipped_view_layer_updates": 0,
+}
+
+
+def get_transaction_stats():
+    return dict(transaction_stats)
+
+
+stats.register_provider("transaction", get_transaction_stats)
+
+
+def is_active():
+    return depth > 0
+
+
+# bpy.ops wrapper class got renamed in Blender 2.90
+def find_ops_wrapper_class():
+    module = sys.modules.get("bpy.ops")
+    for name in ("BPyOpsSubModOp", "_BPyOpsSubModOp"):
+        cls = getattr(module, name, None)
+        if cls is not None and "_view_layer_update" in cls.__dict__:
+            return cls
+    return None
+
+
+def skip_view_layer_update(_context):
+    transaction_stats["skipped_view_layer_updates"] += 1
+
+
+def update():
+    view_layer = bpy.context.view_layer
+    if view_layer:
+        view_layer.update()
+    else:
+        # there is no active view layer in background mode
+        for scene in bpy.data.scenes:
+            for view_layer in scene.view_layers:
+                view_layer.update()
+
+
+def suspend():
+    global saved_global_undo, saved_view_layer_update
+    edit_prefs = bpy.context.preferences.edit
+    saved_global_undo = edit_prefs.use_global_undo
+    edit_prefs.use_global_undo = False
+    cls = find_ops_wrapper_class()
+    if cls is not None:
+        saved_view_layer_update = cls.__dict__["_view_layer_update"]
+        cls._view_layer_update = staticmethod(skip_view_layer_update)
+    else:
+        logger.debug("transaction: unable to find bpy.ops wrapper class, view layer updates won't be deferred")
+
+
+def resume():
+    global saved_global_undo, saved_view_layer_update
+    if saved_view_layer_update is not None:
+        find_ops_wrapper_class()._view_layer_update = saved_view_layer_update
+        saved_view_layer_update = None
+    if saved_global_undo is not None:
+        bpy.context.preferences.edit.use_global_undo = saved_global_undo
+        saved_global_undo = None
+
+
+# called by timers.tag_redraw, 3D views get tagged when the transaction finishes
+def defer_redraw():
+    return depth > 0
+
+
+def finish(undo_message):
+    from bclj import timers
+    update()
+    timers.tag_redraw()
+    if undo_message:
+        bpy.ops.ed.undo_push(message=undo_message)
+
+
+@contextmanager
+def scope(undo_message=None):
+    """Suspends undo pushes, view layer updates and redraws until the outermost scope exits.
+
+    Only undo_message of the outermost scope is used."""
+    global depth
+    if depth == 0:
+        transaction_stats["transactions"] += 1
+        suspend()
+    depth += 1
+    try:
+        yield
+    finally:
+        depth -= 1
+        if depth == 0:
+            try:
+                resume()
+            finally:
+                finish(undo_message)
+
+
+def run(f, undo_message=None):
+    with scope(undo_message):
+        return f()
@@ -11,19 +11,29 @@ except ModuleNotFoundError as e:
 
 from STPyV8 import JSFunction, JSContext
 
+from bclj import stats
+
 logger = logging.getLogger(__name__)
 
 
+@stats.timed("v8.execute_callback")
 def execute_callback(context, code, *args):
     assert (isinstance(code, JSFunction))
     with context as ctx:
         try:
-            code(*args)
+            return code(*args)
         except Exception:
             logger.exception("Unhandled exception while executing a callback", stack_info=True)
             return None
 
 
+def release_memory():
+    # LowMemoryNotification forces full garbage collection in V8
+    low_memory = getattr(STPyV8.JSEngine, "lowMemory", None)
+    if low_memory is not None:
+        low_memory()
+
+
 def report_exceptions(f):
     @wraps(f)
     def wrapper(*args, **kw):
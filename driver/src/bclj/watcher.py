@@ -0,0 +1,191 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+# editors tend to produce bursts of writes (truncate, write, chmod, rename, ...), we coalesce them
+debounce_delay = 0.05
+
+# -- inotify ----------------------------------------------------------------------------------------------------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_TO
+
+event_header = struct.Struct("iIII")
+
+
+def load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            return None
+        return libc
+    except OSError:
+        return None
+
+
+def parse_inotify_events(data):
+    offset = 0
+    while offset + event_header.size <= len(data):
+        wd, mask, _cookie, name_length = event_header.unpack_from(data, offset)
+        offset += event_header.size
+        name = data[offset:offset + name_length].rstrip(b"\0")
+        offset += name_length
+        yield wd, mask, os.fsdecode(name)
+
+
+# we watch parent directories because editors often save by renaming a temp file over the original
+class InotifyBackend(object):
+    name = "inotify"
+
+    def __init__(self, libc, loop, on_event):
+        self._libc = libc
+        self._loop = loop
+        self._on_event = on_event
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # wd -> dir
+        self._wds = {}  # dir -> wd
+        self._files = set()
+        loop.add_reader(self._fd, self._read_events)
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        changed = set()
+        for wd, mask, name in parse_inotify_events(data):
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self._files)
+                continue
+            dir_path = self._dirs.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, name)
+            if path in self._files:
+                changed.add(path)
+        if changed:
+            self._on_event(changed)
+
+    def set_files(self, files):
+        self._files = set(files)
+        dirs = {os.path.dirname(path) for path in self._files}
+        for dir_path in list(self._wds):
+            if dir_path not in dirs:
+                wd = self._wds.pop(dir_path)
+                del self._dirs[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+        for dir_path in dirs:
+            if dir_path not in self._wds:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), watch_mask)
+                if wd < 0:
+                    logger.warning("unable to watch '{}' (errno {})".format(dir_path, ctypes.get_errno()))
+                    continue
+                self._wds[dir_path] = wd
+                self._dirs[wd] = dir_path
+
+    def poll(self):
+        pass
+
+    def close(self):
+        self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+
+
+# -- polling fallback -------------------------------------------------------------------------------------------------------
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PollingBackend(object):
+    name = "polling"
+
+    def __init__(self, on_event):
+        self._on_event = on_event
+        self._mtimes = {}
+
+    def set_files(self, files):
+        self._mtimes = {path: self._mtimes.get(path, get_mtime(path)) for path in files}
+
+    def poll(self):
+        changed = set()
+        for path, last_mtime in self._mtimes.items():
+            mtime = get_mtime(path)
+            if mtime != last_mtime:
+                self._mtimes[path] = mtime
+                changed.add(path)
+        if changed:
+            self._on_event(changed)
+
+    def close(self):
+        self._mtimes = {}
+
+
+# -- API --------------------------------------------------------------------------------------------------------------------
+
+# watches a set of files and calls on_change with a set of changed paths (debounced) on the main loop
+class FileWatcher(object):
+
+    def __init__(self, on_change, force_polling=False):
+        self._on_change = on_change
+        self._loop = asyncio.get_event_loop()
+        self._pending = set()
+        self._flush_handle = None
+        libc = None if force_polling else load_libc()
+        self._backend = None
+        if libc is not None:
+            try:
+                self._backend = InotifyBackend(libc, self._loop, self._schedule)
+            except OSError as e:
+                logger.debug("inotify is not available, falling back to polling: {}".format(e))
+        if self._backend is None:
+            self._backend = PollingBackend(self._schedule)
+        logger.debug("file watcher uses {} backend".format(self._backend.name))
+
+    def _schedule(self, paths):
+        self._pending.update(paths)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = self._loop.call_later(debounce_delay, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        changed = self._pending
+        self._pending = set()
+        if changed:
+            self._on_change(changed)
+
+    @property
+    def backend_name(self):
+        return self._backend.name
+
+    def set_files(self, files):
+        self._backend.set_files([os.path.abspath(path) for path in files])
+
+    # needed only for polling backend, should be called periodically
+    def poll(self):
+        self._backend.poll()
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._backend.close()
@@ -1,24 +1,112 @@
 import asyncio
-import socket
+import os
+import time
 
+from bclj import stats, startup
 
-# https://stackoverflow.com/a/48491563/84283
+# the main asyncio loop is not running on its own, Blender's modal timer pumps it periodically,
+# when there is work we pump more often, when idle we back off up to max interval
+pump_min_interval = 0.005
+pump_max_interval = 0.05
+pump_backoff = 1.5
 
-async def detect_iowait():
-    loop = asyncio.get_event_loop()
-    rsock, wsock = socket.socketpair()
-    wsock.close()
-    await loop.sock_recv(rsock, 1)
-    rsock.close()
+# max time spent running callbacks per tick, to keep the viewport responsive
+pump_budget = float(os.environ.get("BCLJ_PUMP_BUDGET_MS", "8")) / 1000
 
+pump_interval = pump_max_interval
 
-# stop loop.run_forever once iowait is detected
-async def stop_on_iowait():
-    await detect_iowait()
-    asyncio.get_event_loop().stop()
+pump_stats = {
+    "ticks": 0,
+    "busy_ticks": 0,
+    "over_budget_ticks": 0,
+    "iterations": 0,
+    "last_tick_duration": 0.0,
+    "max_tick_duration": 0.0,
+    "total_tick_duration": 0.0,
+    "last_queue_depth": 0,
+    "max_queue_depth": 0,
+    "interval": pump_interval,
+}
 
 
-def drain_asyncio_event_loop():
-    loop = asyncio.get_event_loop()
-    loop.create_task(stop_on_iowait())
+# note: asyncio does not expose its ready queue and timers heap publicly
+def get_ready_queue_depth(loop):
+    ready = getattr(loop, "_ready", None)
+    return len(ready) if ready is not None else 0
+
+
+def get_next_timer_delay(loop):
+    scheduled = getattr(loop, "_scheduled", None)
+    if not scheduled:
+        return None
+    return max(0.0, scheduled[0].when() - loop.time())
+
+
+# runs exactly one loop iteration: polls I/O without blocking and runs callbacks which are ready
+def run_loop_iteration(loop):
+    loop.call_soon(loop.stop)
     loop.run_forever()
+
+
+def compute_next_interval(loop, busy):
+    if busy:
+        interval = pump_min_interval
+    else:
+        interval = min(pump_interval * pump_backoff, pump_max_interval)
+
+    next_timer_delay = get_next_timer_delay(loop)
+    if next_timer_delay is not None:
+        interval = min(interval, max(pump_min_interval, next_timer_delay))
+
+    return interval
+
+
+def record_tick(duration, queue_depth, iterations, busy):
+    pump_stats["ticks"] += 1
+    pump_stats["iterations"] += iterations
+    if busy:
+        pump_stats["busy_ticks"] += 1
+    if duration > pump_budget:
+        pump_stats["over_budget_ticks"] += 1
+    pump_stats["last_tick_duration"] = duration
+    pump_stats["max_tick_duration"] = max(pump_stats["max_tick_duration"], duration)
+    pump_stats["total_tick_duration"] += duration
+    pump_stats["last_queue_depth"] = queue_depth
+    pump_stats["max_queue_depth"] = max(pump_stats["max_queue_depth"], queue_depth)
+    pump_stats["interval"] = pump_interval
+
+
+def get_pump_stats():
+    return dict(pump_stats)
+
+
+stats.register_provider("pump", get_pump_stats)
+
+
+# runs loop iterations until there is no ready work or the budget is exhausted,
+# returns suggested interval for the next tick
+def pump_asyncio_event_loop(budget=None):
+    global pump_interval
+    loop = asyncio.get_event_loop()
+    if pump_stats["ticks"] == 0:
+        startup.signal_ready("pump")
+    if budget is None:
+        budget = pump_budget
+
+    started_at = time.perf_counter()
+    deadline = started_at + budget
+    queue_depth = get_ready_queue_depth(loop)
+    busy = queue_depth > 0
+    iterations = 0
+    while True:
+        run_loop_iteration(loop)
+        iterations += 1
+        remaining = get_ready_queue_depth(loop)
+        if remaining == 0 or time.perf_counter() >= deadline:
+            break
+        busy = True
+        queue_depth = max(queue_depth, remaining)
+
+    pump_interval = compute_next_interval(loop, busy or get_ready_queue_depth(loop) > 0)
+    record_tick(time.perf_counter() - started_at, queue_depth, iterations, busy)
+    return pump_interval
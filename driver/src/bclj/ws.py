@@ -1,11 +1,12 @@
 import asyncio
 import threading
 import time
+from collections import deque
 
 import websockets
 import logging
 
-from bclj import v8, autils, js
+from bclj import log, v8, autils, js, stats
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,7 @@ async_loop: asyncio.AbstractEventLoop
 def start_async_loop_if_needed():
     if "async_loop" not in globals():
         global async_loop
-        async_loop = autils.start_async_loop(__name__)
+        async_loop = autils.get_io_loop()
 
 
 class Event(v8.JSClass):
@@ -42,14 +43,24 @@ class ErrorEvent(Event):
         return self.message
 
 
-def abbreviate_message_for_log(msg):
-    if len(msg) > 300:
-        return msg[:300] + "...}"
-    else:
-        return msg
+global_next_ws_instance_id = 1
 
+# max number of received messages waiting for delivery to js, when full we stop reading from the socket
+inbound_queue_limit = 256
 
-global_next_ws_instance_id = 1
+ws_stats = {
+    "messages": 0,
+    "batches": 0,
+    "max_batch_size": 0,
+    "max_queue_depth": 0,
+}
+
+
+def get_ws_stats():
+    return dict(ws_stats)
+
+
+stats.register_provider("ws", get_ws_stats)
 
 
 # note that this is not full WebSocket implementation,
@@ -61,27 +72,28 @@ class WebSocket(object):
     READY_STATE_CLOSED = 3
 
     async def _reload_page(self):
-        logger.debug("ws#{} finally calling js.reload_page()".format(self.id))
+        logger.debug(log.fmt("ws#{} finally calling js.reload_page()", self.id))
         js.reload_page()
 
     async def _run_client_loop(self):
         logger.info("Connecting via websockets to '{}'".format(self.url))
         try:
             async with websockets.connect(self.url) as ws:
-                logger.debug("ws#{} client_loop: entering receive loop... {}".format(self.id, ws))
+                self._inbound_slots = asyncio.Semaphore(inbound_queue_limit)
+                logger.debug(log.fmt("ws#{} client_loop: entering receive loop... {}", self.id, ws))
                 self._ws = ws
                 await autils.get_result(self._change_ready_state(self.READY_STATE_OPEN))
                 done = False
                 try:
                     while not done:
                         msg = await ws.recv()
-                        logger.debug("ws#{} client_loop: got message len={}\n<< {}".format(self.id, len(msg),
-                                                                                           abbreviate_message_for_log(msg)))
+                        logger.debug(log.fmt("ws#{} client_loop: got message len={}\n<< {}", self.id, len(msg),
+                                             log.abbreviated(msg)))
 
-                        await autils.get_result(self._trigger_handler("onmessage", MessageEvent(msg)))
+                        await self._enqueue_message(msg)
 
                         if "{:type :client/stale}" in msg:
-                            logger.debug("ws#{} stale client detected - scheduling page reload".format(self.id))
+                            logger.debug(log.fmt("ws#{} stale client detected - scheduling page reload", self.id))
                             logger.warning("Detected stale client - will reload...")
                             # give the whole system some time before we attempt to refresh
                             await asyncio.sleep(5)
@@ -89,22 +101,67 @@ class WebSocket(object):
                             done = True
 
                 except websockets.exceptions.ConnectionClosed as e:
-                    logger.debug("ws#{} client_loop: connection closed {}".format(self.id, e))
+                    logger.debug(log.fmt("ws#{} client_loop: connection closed {}", self.id, e))
                     logger.warning("Websockets connection lost")
                     self._trigger_handler("onerror", ErrorEvent(e))
                 except Exception as e:
-                    logger.debug("ws#{} client_loop: exception {}".format(self.id, e))
+                    logger.debug(log.fmt("ws#{} client_loop: exception {}", self.id, e))
                     logger.error("Websocket ran into problems {}".format(e))
                     self._trigger_handler("onerror", ErrorEvent(e))
-                logger.debug("ws#{} client_loop: leaving...".format(self.id))
+                logger.debug(log.fmt("ws#{} client_loop: leaving...", self.id))
                 self._ws = None
 
         except Exception as e:
             self.readyState = self.READY_STATE_CLOSED
             await autils.get_result(self._trigger_handler("onerror", ErrorEvent(e)))
 
+    # -- inbound queue, received messages are delivered to js in batches ---------------------------------------------------
+
+    async def _enqueue_message(self, msg):
+        # backpressure: wait until js side consumes older messages
+        await self._inbound_slots.acquire()
+        with self._inbound_lock:
+            self._inbound.append((msg, time.perf_counter()))
+            depth = len(self._inbound)
+            schedule = not self._delivery_scheduled
+            self._delivery_scheduled = True
+        ws_stats["max_queue_depth"] = max(ws_stats["max_queue_depth"], depth)
+        if schedule:
+            self._main_loop.call_soon_threadsafe(self._deliver_messages)
+
+    def _release_inbound_slots(self, count):
+        for _ in range(count):
+            self._inbound_slots.release()
+
+    # runs on main loop, delivers all messages received so far in one go
+    def _deliver_messages(self):
+        with self._inbound_lock:
+            self._delivery_scheduled = False
+            batch = list(self._inbound)
+            self._inbound.clear()
+        if not batch:
+            return
+        ws_stats["messages"] += len(batch)
+        ws_stats["batches"] += 1
+        ws_stats["max_batch_size"] = max(ws_stats["max_batch_size"], len(batch))
+        logger.debug(log.fmt("ws#{} delivering batch of {} message(s)", self.id, len(batch)))
+        try:
+            handler = self.onmessage
+            if handler is not None:
+                for msg, received_at in batch:
+                    v8.execute_callback(self._window.context, handler, MessageEvent(msg))
+                    if stats.enabled:
+                        stats.record("ws.receive_to_dispatch", time.perf_counter() - received_at)
+        finally:
+            async_loop.call_soon_threadsafe(self._release_inbound_slots, len(batch))
+
+    @property
+    def queue_depth(self):
+        with self._inbound_lock:
+            return len(self._inbound)
+
     async def _trigger_handler_async(self, handler_name, *args):
-        logger.debug("ws#{} triggering handler {} with args={}".format(self.id, handler_name, args))
+        logger.debug(log.fmt("ws#{} triggering handler {} with args={}", self.id, handler_name, args))
         handler = getattr(self, handler_name, None)
         if handler is not None:
             return v8.execute_callback(self._window.context, handler, *args)
@@ -112,6 +169,19 @@ class WebSocket(object):
     def _trigger_handler(self, handler_name, *args):
         return autils.call_soon(self._main_loop, self._trigger_handler_async, handler_name, *args)
 
+    async def _close_connection(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    # closes the connection without notifying js, used when tearing down the window
+    def shutdown(self):
+        self.onmessage = None
+        self.onopen = None
+        self.onclose = None
+        self.onerror = None
+        self.readyState = self.READY_STATE_CLOSED
+        autils.call_soon(async_loop, self._close_connection)
+
     async def _send_message(self, msg):
         try:
             return await self._ws.send(msg)
@@ -131,14 +201,19 @@ class WebSocket(object):
         global global_next_ws_instance_id
         self.id = global_next_ws_instance_id
         global_next_ws_instance_id += 1
-        logger.debug("ws#{} __init__".format(self.id))
+        logger.debug(log.fmt("ws#{} __init__", self.id))
         start_async_loop_if_needed()
 
         assert threading.current_thread() is threading.main_thread()
         self._main_loop = asyncio.get_event_loop()
         # noinspection PyUnresolvedReferences
         self._window = self.__class__.window
+        self._window._websockets.add(self)
         self._ws = None
+        self._inbound = deque()
+        self._inbound_lock = threading.Lock()
+        self._inbound_slots = None
+        self._delivery_scheduled = False
 
         self.protocol = ""
         self.readyState = self.READY_STATE_CONNECTING
@@ -152,12 +227,12 @@ class WebSocket(object):
 
     @v8.report_exceptions
     def send(self, msg, *_):
-        logger.debug("ws#{} send msg={}".format(self.id, abbreviate_message_for_log(msg)))
+        logger.debug(log.fmt("ws#{} send msg={}", self.id, log.abbreviated(msg)))
         autils.call_soon(async_loop, self._send_message, msg)
 
     @v8.report_exceptions
     def close(self, code=None, reason=None, *_):
-        logger.debug("ws#{} close code={} reason={}".format(self.id, code, reason))
+        logger.debug(log.fmt("ws#{} close code={} reason={}", self.id, code, reason))
         self._change_ready_state(self.READY_STATE_CLOSED)
-        self._ws.close()
-        logger.debug("ws#{} closed".format(self.id))
+        autils.call_soon(async_loop, self._close_connection)
+        logger.debug(log.fmt("ws#{} closed", self.id))
@@ -7,7 +7,10 @@
             [apigen.impl.parser :as parser]
             [apigen.impl.generator :as generator]
             [apigen.impl.writer :as writer]
-            [clojure.java.io :as io]))
+            [apigen.impl.manifest :as manifest]
+            [apigen.impl.timing :as timing]
+            [clojure.java.io :as io])
+  (:import (java.util.concurrent Executors ExecutorService Callable ExecutionException)))
 
 (def cli-options
   [["-i" "--input " "Input API XML dir" :default ".workspace/xml"]
@@ -15,6 +18,9 @@
    ["-l" "--logfile PATH" "Output log file"]
    [nil "--only SUBSTR" "Process only files containing a substring (or any from space-separated list of strings)"]
    [nil "--except SUBSTR" "Process only files not containing a substring (or any from space-separated list of strings)"]
+   ["-j" "--jobs N" "Number of files processed in parallel" :default (.availableProcessors (Runtime/getRuntime))
+    :parse-fn #(Integer/parseInt %) :validate [pos? "Must be a positive number"]]
+   ["-f" "--force" "Regenerate all files, ignore manifest of previous run"]
    ["-h" "--help"]])
 
 (defn usage [options-summary]
@@ -41,11 +47,15 @@
 
 (def ansi-rewind "\033[1A\033[2K")
 
+; files are processed in parallel, we don't want to interleave lines
+(def report-lock (Object.))
+
 (defn report! [channel s]
-  (case channel
-    :info (println (str ansi-rewind s))
-    (:warn :log) (binding [*out* *log*]
-                   (println s))))
+  (locking report-lock
+    (case channel
+      :info (println (str ansi-rewind s))
+      (:warn :log) (binding [*out* *log*]
+                     (println s)))))
 
 (defn open-log [name]
   (let [f (io/file name)]
@@ -124,30 +134,72 @@
 
 ; -- worker -----------------------------------------------------------------------------------------------------------------
 
-(defn get-worker-xf [out-dir]
-  (comp (reader/read-xml-data-xf report!)
-        (parser/parse-xml-data-xf report!)
-        (generator/generate-xf report!)
-        (writer/write-sources-xf out-dir report!)))
-
-(defn overlook
-  ([] :ok)
-  ([v] v)
-  ([a v] (if (and (= a :ok) (= v :ok))
-           :ok
-           :fail)))
+(def stages [:hash :read :parse :generate :write])
+
+(defn process-xml-file! [output manifest file]
+  (let [hash (timing/timed :hash (manifest/hash-file file))]
+    (if (manifest/up-to-date? manifest output file hash)
+      {:file   file
+       :status :up-to-date}
+      (let [xml-data (timing/timed :read (into [] (reader/read-xml-data-xf report!) [file]))
+            api-data (timing/timed :parse (into [] (parser/parse-xml-data-xf report!) xml-data))
+            sources (timing/timed :generate (into [] (generator/generate-xf report!) api-data))
+            results (timing/timed :write (into [] (writer/write-changed-sources-xf output report!) sources))]
+        {:file    file
+         :status  :generated
+         :hash    hash
+         :outputs (map first results)
+         :writes  (map second results)}))))
+
+(defn unwrap-execution-exception [f]
+  (try
+    (f)
+    (catch ExecutionException e
+      (throw (.getCause e)))))
+
+(defn run-in-parallel [jobs f items]
+  (let [^ExecutorService executor (Executors/newFixedThreadPool jobs)]
+    (try
+      (let [submit (fn [item]
+                     (.submit executor ^Callable (bound-fn [] (f item))))
+            futures (mapv submit items)]
+        (mapv #(unwrap-execution-exception (fn [] (.get %))) futures))
+      (finally
+        (.shutdown executor)))))
+
+(defn update-manifest [manifest results]
+  (let [* (fn [manifest {:keys [status file hash outputs]}]
+            (if (= status :generated)
+              (manifest/record-input manifest file hash outputs)
+              manifest))]
+    (reduce * manifest results)))
+
+(defn summarize-results [results]
+  (let [statuses (frequencies (map :status results))
+        writes (frequencies (mapcat :writes results))]
+    (str "processed " (count results) " file(s): "
+         (get statuses :generated 0) " regenerated, "
+         (get statuses :up-to-date 0) " up-to-date, "
+         (get writes :written 0) " output file(s) written, "
+         (get writes :unchanged 0) " unchanged")))
 
 (defn work! [options]
   (println)
-  (let [{:keys [input output logfile]} options]
+  (let [{:keys [input output logfile jobs force]} options
+        started-at (System/nanoTime)]
     (with-log logfile
       (report! :log (pr-str options))
       (report! :log "")
-      (let [all-xml-files (reader/list-xml-files input)
-            xml-files (keep (partial filter-xml-file options) all-xml-files)
-            worker-xf (get-worker-xf output)
-            result (transduce worker-xf overlook xml-files)]
-        (report! :info (str "processed " (count xml-files) " file(s) with result " result))))))
+      (binding [timing/*timings* (timing/make-timings)]
+        (let [all-xml-files (reader/list-xml-files input)
+              xml-files (keep (partial filter-xml-file options) all-xml-files)
+              manifest (if force
+                         (manifest/empty-manifest)
+                         (manifest/load-manifest output))
+              results (run-in-parallel jobs (partial process-xml-file! output manifest) xml-files)]
+          (manifest/save-manifest! output (update-manifest manifest results))
+          (report! :info (summarize-results results))
+          (timing/print-timings @timing/*timings* stages (- (System/nanoTime) started-at)))))))
 
 ; -- main -------------------------------------------------------------------------------------------------------------------
 
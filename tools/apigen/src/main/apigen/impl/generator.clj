@@ -181,15 +181,47 @@
 (defn gen-cljs-params-type-specs [params-data]
   (keep gen-cljs-params-type-spec params-data))
 
+; e.g. "enum in ['WORLD','VIEW','CURSOR'], (optional)" or "enum set in {'SELECT', 'DESELECT'}, (optional)"
+(defn parse-enum-items [type-spec]
+  (if-some [[_ items] (re-find #"enum(?: set)? in [\[{]([^\]}]*)[\]}]" (or type-spec ""))]
+    (map second (re-seq #"'([^']*)'" items))))
+
+(defn gen-cljs-enums-index [type-spec]
+  (if-some [items (seq (parse-enum-items type-spec))]
+    `(~'js-obj ~@(mapcat (fn [item] [(string/lower-case item) item]) items))))
+
+(defn gen-cljs-param-index-entry [[python-name type-spec]]
+  [(invariants/clojure-name python-name)
+   `(~'array ~python-name ~type-spec ~(gen-cljs-enums-index type-spec))])
+
+; note: js-obj and array with literal args compile to plain js literals, so unused indices get elided as well
+(defn gen-cljs-params-index [[fn-name params-type-spec]]
+  (let [name (symbol (invariants/params-index-var-name fn-name))]
+    `(~'def ~name (~'js-obj ~@(mapcat gen-cljs-param-index-entry params-type-spec)))))
+
+(defn gen-cljs-params-indices [params-data]
+  (keep gen-cljs-params-index params-data))
+
+(defn gen-cljs-handle [[fn-name _params-type-spec]]
+  `(~'def ~(symbol (invariants/handle-var-name fn-name)) nil))
+
+(defn gen-cljs-handles [params-data]
+  (keep gen-cljs-handle params-data))
+
 (defn gen-cljs [_api module]
   (let [ns-name (invariants/get-module-ns-name module)
         params (invariants/get-module-params module)
         file-path (invariants/safe-ns-file-path ns-name ".cljs")
         generated-param-type-specs (gen-cljs-params-type-specs params)
+        generated-params-indices (gen-cljs-params-indices params)
+        generated-handles (gen-cljs-handles params)
         parts (concat [(gen-cljs-ns ns-name)]
                       [(CodeComment. (str "note: in :advanced build unused params below should get elided"
                                           " by Google Closure Compiler"))]
-                      generated-param-type-specs)]
+                      generated-param-type-specs
+                      generated-params-indices
+                      [(CodeComment. "bound python handles, see bcljs.compiler/bind-handles?")]
+                      generated-handles)]
     [file-path (output/pprint parts)]))
 
 ; ---------------------------------------------------------------------------------------------------------------------------
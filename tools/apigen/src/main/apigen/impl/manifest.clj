@@ -0,0 +1,87 @@
+(ns apigen.impl.manifest
+  (:require [clojure.java.io :as io]
+            [clojure.edn :as edn]
+            [apigen.impl.helpers :refer [pprint-edn-as-str]])
+  (:import (java.security MessageDigest)
+           (java.nio.file Files)))
+
+; manifest remembers content hash of each input xml file and generator version it was generated with,
+; unchanged inputs are skipped on next run
+;
+; generator version is a hash of generator sources, so touching the generator invalidates everything
+
+(def manifest-file-name ".apigen-manifest.edn")
+
+(def generator-sources
+  ["apigen/impl/generator.clj"
+   "apigen/impl/parser.clj"
+   "apigen/impl/lexer.clj"
+   "apigen/impl/kern.clj"
+   "apigen/impl/docstring.clj"
+   "apigen/impl/output.clj"
+   "apigen/impl/text.clj"
+   "apigen/impl/word_wrap.clj"
+   "apigen/impl/helpers.clj"
+   "apigen/impl/types.clj"
+   "bcljs/invariants.cljc"])
+
+(defn bytes->hex [bytes]
+  (apply str (map #(format "%02x" (bit-and % 0xff)) bytes)))
+
+(defn hash-bytes [& chunks]
+  (let [digest (MessageDigest/getInstance "SHA-256")]
+    (doseq [chunk chunks]
+      (.update digest ^bytes chunk))
+    (bytes->hex (.digest digest))))
+
+(defn hash-file [file]
+  (hash-bytes (Files/readAllBytes (.toPath (io/file file)))))
+
+(defn compute-generator-version []
+  (let [read-resource (fn [path]
+                        (if-some [resource (io/resource path)]
+                          (.getBytes (slurp resource) "UTF-8")
+                          (byte-array 0)))]
+    (apply hash-bytes (map read-resource generator-sources))))
+
+(def generator-version (delay (compute-generator-version)))
+
+; -- API --------------------------------------------------------------------------------------------------------------------
+
+(defn manifest-file [out-dir]
+  (io/file out-dir manifest-file-name))
+
+(defn empty-manifest []
+  {:generator-version @generator-version
+   :inputs            {}})
+
+(defn load-manifest [out-dir]
+  (let [file (manifest-file out-dir)]
+    (or (if (.exists file)
+          (let [manifest (try
+                           (edn/read-string (slurp file))
+                           (catch Exception _e))]
+            (if (= (:generator-version manifest) @generator-version)
+              manifest)))
+        (empty-manifest))))
+
+(defn save-manifest! [out-dir manifest]
+  (let [file (manifest-file out-dir)]
+    (io/make-parents file)
+    (spit file (pprint-edn-as-str manifest 120))))
+
+(defn input-key [file]
+  (.getName (io/file file)))
+
+(defn outputs-exist? [out-dir outputs]
+  (every? #(.exists (io/file out-dir %)) outputs))
+
+(defn up-to-date? [manifest out-dir file hash]
+  (let [entry (get-in manifest [:inputs (input-key file)])]
+    (and (some? entry)
+         (= (:hash entry) hash)
+         (outputs-exist? out-dir (:outputs entry)))))
+
+(defn record-input [manifest file hash outputs]
+  (assoc-in manifest [:inputs (input-key file)] {:hash    hash
+                                                 :outputs (vec (sort outputs))}))
@@ -0,0 +1,40 @@
+(ns apigen.impl.timing
+  (:require [clojure.pprint :refer [print-table]]))
+
+; per-stage timings, stages run on multiple threads so we sum time spent in each stage across all threads
+; and report it next to total wall time
+
+(def ^:dynamic *timings* nil)
+
+(defn make-timings []
+  (atom {}))
+
+(defn record! [stage nanos]
+  (if (some? *timings*)
+    (swap! *timings* update stage (fn [{:keys [count nanos-total] :or {count 0 nanos-total 0}}]
+                                    {:count       (inc count)
+                                     :nanos-total (+ nanos-total nanos)}))))
+
+(defmacro timed [stage & body]
+  `(let [start# (System/nanoTime)]
+     (try
+       ~@body
+       (finally
+         (record! ~stage (- (System/nanoTime) start#))))))
+
+(defn nanos->ms [nanos]
+  (format "%.1f" (/ nanos 1e6)))
+
+(defn timings-table [timings stages]
+  (for [stage stages
+        :let [{:keys [count nanos-total]} (get timings stage)]
+        :when (some? count)]
+    {:stage   (name stage)
+     :count   count
+     :time-ms (nanos->ms nanos-total)}))
+
+(defn print-timings [timings stages wall-nanos]
+  (print-table [:stage :count :time-ms] (concat (timings-table timings stages)
+                                                [{:stage   "total (wall)"
+                                                  :count   ""
+                                                  :time-ms (nanos->ms wall-nanos)}])))
@@ -3,6 +3,19 @@
             [clojure.java.io :as io]
             [apigen.impl.status :as status]))
 
+(defn same-content? [file content]
+  (and (.exists file)
+       (= (slurp file) content)))
+
+; we don't touch files with unchanged content, so file watchers (shadow-cljs) don't recompile them
+(defn write-source-if-changed! [full-path file-content]
+  (if (same-content? full-path file-content)
+    :unchanged
+    (do
+      (io/make-parents full-path)
+      (spit full-path file-content)
+      :written)))
+
 ; -- API --------------------------------------------------------------------------------------------------------------------
 
 (defn write-sources-xf [dir reporter]
@@ -10,11 +23,20 @@
             (binding [status/*reporter* reporter]
               (let [full-path (io/file dir path)]
                 (status/info (str "writing '" full-path "'"))
-                (io/make-parents full-path)
-                (spit full-path file-content)
+                (write-source-if-changed! full-path file-content)
                 :ok)))]
     (map *)))
 
+(defn write-changed-sources-xf [dir reporter]
+  (let [* (fn [[path file-content]]
+            (binding [status/*reporter* reporter]
+              (let [full-path (io/file dir path)
+                    result (write-source-if-changed! full-path file-content)]
+                (if (= result :written)
+                  (status/info (str "written '" full-path "'")))
+                [path result])))]
+    (map *)))
+
 (defn write-sources! [dir files & [reporter]]
   (let [xf (write-sources-xf dir reporter)]
     (into [] xf files)))